@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def thumbnails_without_pool(settings):
+    """Без фонового пула миниатюр: тестовая база SQLite в памяти
+    блокирует таблицы целиком, и запись миниатюр из потока пула
+    роняла бы запросы теста."""
+    settings.THUMBNAIL_WORKERS = 0
@@ -0,0 +1,74 @@
+"""SQLite для нескольких воркеров: WAL, прагмы и ожидание занятой базы.
+
+Отличия от стандартного бэкенда:
+
+* прагмы из OPTIONS['pragmas'] выполняются на каждом новом соединении
+  (journal_mode=wal позволяет читать во время записи);
+* транзакции atomic начинаются с BEGIN IMMEDIATE: блокировка записи
+  берётся сразу, а не при первом INSERT посреди транзакции, когда SQLite
+  отвечает «database is locked», не дожидаясь busy timeout (иначе была бы
+  взаимная блокировка двух писателей);
+* если база занята дольше timeout, прагмы, BEGIN IMMEDIATE и одиночные
+  запросы вне транзакции повторяются до OPTIONS['busy_retries'] раз с растущей
+  паузой: до них ещё ничего не изменено, повтор безопасен.
+"""
+import random
+import time
+
+from django.db.backends.sqlite3 import base
+
+BUSY_MESSAGE = 'database is locked'
+BACKOFF = 0.05
+
+
+def retry_busy(connection, retries, execute, *args):
+    """Повторяет execute, пока база занята, если транзакция не начата."""
+    for attempt in range(retries + 1):
+        try:
+            return execute(*args)
+        except base.Database.OperationalError as exc:
+            if (attempt == retries or BUSY_MESSAGE not in str(exc)
+                    or connection.in_transaction):
+                raise
+        time.sleep(BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+class RetryingCursorWrapper(base.SQLiteCursorWrapper):
+    busy_retries = 0
+
+    def execute(self, query, params=None):
+        return retry_busy(
+            self.connection, self.busy_retries, super().execute,
+            query, params)
+
+    def executemany(self, query, param_list):
+        return retry_busy(
+            self.connection, self.busy_retries, super().executemany,
+            query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = options.get('pragmas', {})
+        self.busy_retries = options.get('busy_retries', 0)
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('busy_retries', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            # Переход в WAL требует монопольной блокировки базы.
+            retry_busy(connection, self.busy_retries, connection.execute,
+                       f'PRAGMA {name} = {value}')
+        return connection
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=RetryingCursorWrapper)
+        cursor.busy_retries = self.busy_retries
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
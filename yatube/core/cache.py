@@ -0,0 +1,35 @@
+import time
+
+from django.core.cache import cache
+
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2
+WAIT_STEP = 0.05
+
+
+def get_or_compute(key, compute, timeout):
+    """Достаёт значение из кэша, при промахе считает его один раз.
+
+    Пересчётом занимается только процесс, захвативший блокировку
+    `<key>:lock` (cache.add атомарен), остальные ждут готового значения
+    до LOCK_WAIT секунд и только потом считают сами. Так истёкший или
+    инвалидированный ключ не превращается в лавину одинаковых запросов.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return compute()
@@ -0,0 +1,393 @@
+"""Кэш-бэкенды, общие для всех процессов-воркеров.
+
+SQLiteCache хранит записи в одном файле SQLite (WAL), RedisCache — в
+Redis; TwoLevelCache ставит перед любым из них небольшой LRU-кэш в памяти
+процесса с коротким временем жизни.
+"""
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from core.metrics import CACHE_REQUESTS
+
+CULL_PROBABILITY = 0.01
+
+
+def dumps(value):
+    # Целые храним как есть, чтобы incr выполнялся на стороне хранилища.
+    if type(value) is int:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def loads(value):
+    if isinstance(value, int):
+        return value
+    return pickle.loads(value)
+
+
+@contextmanager
+def immediate(connection):
+    """Транзакция, захватывающая блокировку записи с самого начала."""
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite, безопасный для нескольких процессов.
+
+    LOCATION — путь к файлу базы. Атомарность add/incr обеспечивают
+    транзакции SQLite, одновременное чтение — журнал WAL.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.location, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+            self._local.connection = connection
+        return connection
+
+    def _alive(self):
+        return '(expires IS NULL OR expires > ?)'
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._connection.execute(
+            f'SELECT value FROM cache WHERE key = ? AND {self._alive()}',
+            (key, time.time())
+        ).fetchone()
+        return default if row is None else loads(row[0])
+
+    def get_many(self, keys, version=None):
+        made = {self.make_key(key, version=version): key for key in keys}
+        if not made:
+            return {}
+        placeholders = ', '.join('?' * len(made))
+        rows = self._connection.execute(
+            f'SELECT key, value FROM cache '
+            f'WHERE key IN ({placeholders}) AND {self._alive()}',
+            (*made, time.time())
+        )
+        return {made[key]: loads(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (key, dumps(value), self.get_backend_timeout(timeout))
+        )
+        if random.random() < CULL_PROBABILITY:
+            self._cull()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection
+        with immediate(connection):
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time())
+            )
+            return connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (key, dumps(value), self.get_backend_timeout(timeout))
+            ).rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection
+        with immediate(connection):
+            row = connection.execute(
+                f'SELECT value FROM cache WHERE key = ? AND {self._alive()}',
+                (key, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (dumps(value), key))
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._connection.execute(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {self._alive()}',
+            (self.get_backend_timeout(timeout), key, time.time())
+        ).rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version) is not self
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт всё время потока, как и у LocMemCache.
+        pass
+
+    def _cull(self):
+        connection = self._connection
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        excess = connection.execute(
+            'SELECT COUNT(*) FROM cache').fetchone()[0] - self._max_entries
+        if excess > 0:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (excess + self._max_entries // self._cull_frequency,)
+            )
+
+
+class RedisCache(BaseCache):
+    """Кэш в Redis.
+
+    LOCATION — URL сервера. OPTIONS['CLIENT_CLASS'] задаёт класс клиента
+    с интерфейсом redis.Redis (по умолчанию 'redis.Redis'), поэтому в
+    тестах сервер можно заменить локальной заглушкой.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        client_class = params.get('OPTIONS', {}).get(
+            'CLIENT_CLASS', 'redis.Redis')
+        try:
+            client_class = import_string(client_class)
+        except ImportError as error:
+            raise ImproperlyConfigured(
+                f'RedisCache requires {client_class}: {error}') from error
+        self._client = client_class.from_url(location)
+
+    def _expiry(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return None
+        return max(1, int((timeout - time.time()) * 1000))
+
+    @staticmethod
+    def _dumps(value):
+        value = dumps(value)
+        return str(value).encode() if isinstance(value, int) else value
+
+    @staticmethod
+    def _loads(raw):
+        if raw[:1] == b'\x80':
+            return pickle.loads(raw)
+        return int(raw)
+
+    def get(self, key, default=None, version=None):
+        raw = self._client.get(self.make_key(key, version=version))
+        return default if raw is None else self._loads(raw)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        raws = self._client.mget(
+            [self.make_key(key, version=version) for key in keys])
+        return {
+            key: self._loads(raw)
+            for key, raw in zip(keys, raws) if raw is not None
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._client.set(
+            self.make_key(key, version=version), self._dumps(value),
+            px=self._expiry(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(self._client.set(
+            self.make_key(key, version=version), self._dumps(value),
+            px=self._expiry(timeout), nx=True))
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        if not self._client.exists(key):
+            raise ValueError(f"Key '{key}' not found")
+        return self._client.incrby(key, delta)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        expiry = self._expiry(timeout)
+        if expiry is None:
+            return bool(self._client.persist(key))
+        return bool(self._client.pexpire(key, expiry))
+
+    def delete(self, key, version=None):
+        self._client.delete(self.make_key(key, version=version))
+
+    def has_key(self, key, version=None):
+        return bool(self._client.exists(self.make_key(key, version=version)))
+
+    def clear(self):
+        self._client.flushdb()
+
+
+_fronts = {}
+_front_locks = {}
+_stats = {}
+# Результат чтения -> ключ счётчика TwoLevelCache.stats.
+STATS = {'front_hit': 'front_hits', 'shared_hit': 'shared_hits',
+         'miss': 'misses'}
+
+
+class TwoLevelCache(BaseCache):
+    """LRU-кэш процесса перед общим кэшем из CACHES[OPTIONS['SHARED']].
+
+    Записи в памяти живут не дольше FRONT_TIMEOUT секунд, поэтому
+    изменения, сделанные другими процессами, видны с этой задержкой;
+    изменения своего процесса видны сразу.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.front_timeout = options.get('FRONT_TIMEOUT', 1)
+        self.front_max_entries = options.get('FRONT_MAX_ENTRIES', 1000)
+        self._front = _fronts.setdefault(name, OrderedDict())
+        self._lock = _front_locks.setdefault(name, threading.Lock())
+        self.name = name or 'default'
+        self.stats = _stats.setdefault(name, Counter())
+        self._shared = None
+
+    @property
+    def shared(self):
+        if self._shared is None:
+            self._shared = caches[self.shared_alias]
+        return self._shared
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._front[key] = (value, time.monotonic() + self.front_timeout)
+            self._front.move_to_end(key)
+            while len(self._front) > self.front_max_entries:
+                self._front.popitem(last=False)
+
+    def _recall(self, key):
+        with self._lock:
+            entry = self._front.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._front[key]
+                return None
+            self._front.move_to_end(key)
+            return entry
+
+    def _count(self, result, amount=1):
+        if amount:
+            self.stats[STATS[result]] += amount
+            CACHE_REQUESTS.inc(amount, cache=self.name, result=result)
+
+    def _forget(self, key):
+        with self._lock:
+            self._front.pop(key, None)
+
+    def get(self, key, default=None, version=None):
+        full_key = self.make_key(key, version=version)
+        entry = self._recall(full_key)
+        if entry is not None:
+            self._count('front_hit')
+            return entry[0]
+        value = self.shared.get(key, self, version=version)
+        if value is self:
+            self._count('miss')
+            return default
+        self._count('shared_hit')
+        self._remember(full_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            entry = self._recall(self.make_key(key, version=version))
+            if entry is None:
+                missing.append(key)
+            else:
+                found[key] = entry[0]
+        self._count('front_hit', len(found))
+        if missing:
+            shared = self.shared.get_many(missing, version=version)
+            for key, value in shared.items():
+                self._remember(self.make_key(key, version=version), value)
+            found.update(shared)
+            self._count('shared_hit', len(shared))
+            self._count('miss', len(missing) - len(shared))
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, self._timeout(timeout), version=version)
+        self._remember(self.make_key(key, version=version), value)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(
+            key, value, self._timeout(timeout), version=version)
+        if added:
+            self._remember(self.make_key(key, version=version), value)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        self._forget(self.make_key(key, version=version))
+        return self.shared.incr(key, delta, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(
+            key, self._timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self._forget(self.make_key(key, version=version))
+        self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version) is not self
+
+    def clear(self):
+        with self._lock:
+            self._front.clear()
+        self.shared.clear()
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
@@ -0,0 +1,125 @@
+"""Раскладка моделей по базам: отдельные файлы и реплики.
+
+SplitRouter держит модели из DATABASE_SPLIT_MODELS в собственных базах:
+у каждого файла SQLite свой замок записи, и поток комментариев не ждёт
+публикации постов. Связи с такими моделями не должны порождать JOIN между
+файлами — соответствующие выборки делаются отдельными запросами.
+
+Чтение с реплик для страниц только на чтение.
+
+ReplicaRoutingMiddleware включает реплики на время view из
+DATABASE_REPLICA_VIEWS: все чтения такого запроса идут в одну случайно
+выбранную реплику из DATABASE_REPLICAS. Запись всегда идёт в default.
+Сессия, которая что-то записала, DATABASE_STICKY_SECONDS секунд читает
+только с default: после post_create профиль и после add_comment пост
+показываются уже с новой записью, даже если реплика отстаёт.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+PRIMARY = 'default'
+STICKY_SESSION_KEY = '_primary_until'
+
+_state = threading.local()
+
+
+def replica():
+    """Реплика для чтений текущего запроса или None."""
+    return getattr(_state, 'replica', None)
+
+
+def split_alias(model):
+    """База модели из DATABASE_SPLIT_MODELS или None."""
+    return settings.DATABASE_SPLIT_MODELS.get(model._meta.label_lower)
+
+
+def known_aliases():
+    # Основная база, отдельные файлы и реплики — копии одной схемы.
+    return set(settings.DATABASES)
+
+
+class SplitRouter:
+    def db_for_read(self, model, **hints):
+        return split_alias(model)
+
+    def db_for_write(self, model, **hints):
+        alias = split_alias(model)
+        if alias is not None:
+            _state.wrote = True
+        return alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = known_aliases()
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        split = settings.DATABASE_SPLIT_MODELS
+        alias = split.get(f'{app_label}.{model_name}')
+        if alias is not None:
+            # В основной базе таблица остаётся пустой: по ней CASCADE ищет
+            # зависимые строки при удалении постов и пользователей.
+            return db in (alias, PRIMARY)
+        # В отдельных базах — только их таблицы, без RunPython и RunSQL.
+        if db in split.values():
+            return False
+        return None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return replica() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = known_aliases()
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными от основной базы.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Направляет чтения view только на чтение в реплику.
+
+    Ставится после SessionMiddleware и AuthenticationMiddleware;
+    без DATABASE_REPLICAS не используется.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.replica = None
+        if _state.wrote and hasattr(request, 'session'):
+            request.session[STICKY_SESSION_KEY] = (
+                time.time() + settings.DATABASE_STICKY_SECONDS)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.resolver_match.view_name
+                not in settings.DATABASE_REPLICA_VIEWS):
+            return
+        session = getattr(request, 'session', {})
+        if session.get(STICKY_SESSION_KEY, 0) > time.time():
+            return
+        _state.replica = random.choice(settings.DATABASE_REPLICAS)
@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache_backends import SQLiteCache, TwoLevelCache
+
+# Популярность страниц распределена по Ципфу: немногие горячие ключи
+# и длинный хвост, как у главной, групп и профилей.
+ZIPF_S = 1.1
+
+
+def make_backend(kind, location):
+    if kind == 'locmem':
+        return LocMemCache(f'bench-{os.getpid()}', {
+            'OPTIONS': {'MAX_ENTRIES': 100000}})
+    shared = SQLiteCache(location, {'OPTIONS': {'MAX_ENTRIES': 100000}})
+    if kind == 'sqlite':
+        return shared
+    backend = TwoLevelCache(f'bench-{os.getpid()}', {
+        'OPTIONS': {'FRONT_TIMEOUT': 1, 'FRONT_MAX_ENTRIES': 1000}})
+    backend._shared = shared
+    return backend
+
+
+def worker(kind, location, keys, requests, seed, results):
+    backend = make_backend(kind, location)
+    weights = [1 / rank ** ZIPF_S for rank in range(1, keys + 1)]
+    chooser = random.Random(seed)
+    hits = 0
+    started = time.perf_counter()
+    for key in chooser.choices(range(keys), weights, k=requests):
+        if backend.get(f'page:{key}') is None:
+            backend.set(f'page:{key}', 'x' * 2048, 300)
+        else:
+            hits += 1
+    results.put((hits, time.perf_counter() - started))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает долю попаданий в кэш при N воркерах для locmem, '
+            'общего SQLite-кэша и SQLite с LRU в памяти процесса.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+        parser.add_argument('--requests', type=int, default=5000,
+                            help='запросов на одного воркера')
+        parser.add_argument('--keys', type=int, default=2000,
+                            help='число различных страниц')
+        parser.add_argument(
+            '--backends', nargs='+', default=['locmem', 'sqlite', 'twolevel'],
+            choices=['locmem', 'sqlite', 'twolevel'])
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"backend":<10} {"workers":>7} {"hit rate":>9} {"ops/s":>10}')
+        for kind in options['backends']:
+            for workers in options['workers']:
+                hit_rate, throughput = self.run(kind, workers, options)
+                self.stdout.write(
+                    f'{kind:<10} {workers:>7} {hit_rate:>9.1%} '
+                    f'{throughput:>10.0f}')
+
+    def run(self, kind, workers, options):
+        with tempfile.TemporaryDirectory() as directory:
+            location = os.path.join(directory, 'cache.sqlite3')
+            context = multiprocessing.get_context('fork')
+            results = context.Queue()
+            processes = [
+                context.Process(target=worker, args=(
+                    kind, location, options['keys'], options['requests'],
+                    seed, results))
+                for seed in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            outcomes = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+        total = options['requests'] * workers
+        hits = sum(hits for hits, _ in outcomes)
+        elapsed = max(seconds for _, seconds in outcomes)
+        return hits / total, total / elapsed
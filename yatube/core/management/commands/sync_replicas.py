@@ -0,0 +1,26 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик из '
+            'DATABASE_REPLICAS (локальная замена репликации).')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены: задайте '
+                               'YATUBE_DB_REPLICAS')
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError('Копировать можно только базу SQLite')
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            path = connections[alias].settings_dict['NAME']
+            # backup() целиком и согласованно переписывает файл реплики,
+            # не мешая тем, кто сейчас из неё читает.
+            with sqlite3.connect(path) as target:
+                primary.connection.backup(target)
+            self.stdout.write(f'{alias}: {path}')
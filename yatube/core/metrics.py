@@ -0,0 +1,396 @@
+"""Метрики приложения в текстовом формате Prometheus.
+
+Каждый поток каждого процесса пишет в собственный файл
+METRICS_DIR/<pid>-<слот>.db, отображённый в память: увеличение счётчика —
+это запись восьми байт в mmap, без блокировок и системных вызовов. Слот
+завершившегося потока достаётся следующему потоку процесса вместе
+с файлом, поэтому файлов не больше, чем потоков, работавших одновременно.
+Страница /metrics читает все файлы каталога и складывает значения, так что
+счётчики суммируются по всем воркерам, в том числе уже завершившимся:
+при старте воркер переносит значения файлов мёртвых процессов
+в archive.db и удаляет эти файлы (compact).
+
+Формат файла: восемь байт — занятая длина, дальше записи «длина ключа
+(4 байта), ключ, выравнивание до 8 байт, значение (double)». Ключ —
+готовое имя сэмпла с метками, например
+yatube_http_responses_total{view="posts:index",status="200"}. Новая запись
+сначала пишется целиком и только потом учитывается в занятой длине,
+поэтому читатель никогда не видит её наполовину.
+"""
+import bisect
+import fcntl
+import itertools
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import weakref
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from core.query_budget import count_queries
+
+INITIAL_SIZE = 64 * 1024
+_used = struct.Struct('Q')
+_length = struct.Struct('I')
+_value = struct.Struct('d')
+_le = re.compile(r'le="([^"]+)"')
+
+ARCHIVE = 'archive.db'
+
+_local = threading.local()
+_slots_lock = threading.Lock()
+_free_slots = []
+_new_slots = itertools.count()
+REGISTRY = []
+
+
+def _reset_after_fork():
+    # Потомок не должен писать в файл родителя.
+    global _local, _slots_lock, _free_slots, _new_slots
+    _slots_lock = threading.Lock()
+    _free_slots = []
+    _new_slots = itertools.count()
+    _local = threading.local()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _aligned(size):
+    return (size + 7) & ~7
+
+
+def _parse(buffer):
+    """Пары (ключ, смещение значения) из содержимого файла."""
+    used = _used.unpack_from(buffer, 0)[0] if len(buffer) >= 8 else 0
+    used = min(used, len(buffer))
+    position = _used.size
+    while position < used:
+        length = _length.unpack_from(buffer, position)[0]
+        key = bytes(buffer[position + 4:position + 4 + length]).decode()
+        offset = position + _aligned(4 + length)
+        yield key, offset
+        position = offset + _value.size
+
+
+class MetricsFile:
+    """Файл значений одного потока; пишет в него только этот поток."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a+b')
+        if os.fstat(self.file.fileno()).st_size < INITIAL_SIZE:
+            self.file.truncate(INITIAL_SIZE)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.used = _used.unpack_from(self.map, 0)[0] or _used.size
+        self.positions = dict(_parse(self.map))
+
+    def add(self, key, amount):
+        offset = self.positions.get(key)
+        if offset is None:
+            offset = self._append(key)
+        value = _value.unpack_from(self.map, offset)[0]
+        _value.pack_into(self.map, offset, value + amount)
+
+    def _append(self, key):
+        encoded = key.encode()
+        offset = self.used + _aligned(4 + len(encoded))
+        end = offset + _value.size
+        if end > len(self.map):
+            size = max(2 * len(self.map), _aligned(end))
+            self.map.close()
+            self.file.truncate(size)
+            self.map = mmap.mmap(self.file.fileno(), 0)
+        _length.pack_into(self.map, self.used, len(encoded))
+        self.map[self.used + 4:self.used + 4 + len(encoded)] = encoded
+        _value.pack_into(self.map, offset, 0.0)
+        self.used = end
+        _used.pack_into(self.map, 0, end)
+        self.positions[key] = offset
+        return offset
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def _take_slot():
+    with _slots_lock:
+        return _free_slots.pop() if _free_slots else next(_new_slots)
+
+
+def _release_slot(slot):
+    with _slots_lock:
+        _free_slots.append(slot)
+
+
+def _file():
+    directory = settings.METRICS_DIR
+    current = getattr(_local, 'file', None)
+    if current is None or os.path.dirname(current.path) != directory:
+        os.makedirs(directory, exist_ok=True)
+        slot = _take_slot()
+        current = _local.file = MetricsFile(os.path.join(
+            directory, f'{os.getpid()}-{slot}.db'))
+        # Данные потока удаляются вместе с ним, и слот освобождается.
+        weakref.finalize(current, _release_slot, slot)
+    return current
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def compact(directory=None):
+    """Переносит значения файлов завершившихся процессов в archive.db.
+
+    Суммы на /metrics не меняются, а файлы мёртвых воркеров не копятся.
+    Под файловой блокировкой: два стартующих воркера не перенесут один
+    файл дважды.
+    """
+    directory = directory or settings.METRICS_DIR
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'compact.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = MetricsFile(os.path.join(directory, ARCHIVE))
+        try:
+            for name in os.listdir(directory):
+                pid = name.partition('-')[0]
+                if (not name.endswith('.db') or not pid.isdigit()
+                        or _alive(int(pid))):
+                    continue
+                path = os.path.join(directory, name)
+                with open(path, 'rb') as source:
+                    buffer = source.read()
+                for key, offset in _parse(buffer):
+                    archive.add(key, _value.unpack_from(buffer, offset)[0])
+                os.remove(path)
+        finally:
+            archive.close()
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n')
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        # Готовые ключи по значениям меток: форматирование строк дороже
+        # самой записи в mmap.
+        self._keys = {}
+        REGISTRY.append(self)
+
+    def key(self, sample, values, extra=''):
+        pairs = ','.join(
+            f'{label}="{_escape(value)}"'
+            for label, value in zip(self.labels, values))
+        if extra:
+            pairs = f'{pairs},{extra}' if pairs else extra
+        return f'{sample}{{{pairs}}}' if pairs else sample
+
+    def keys(self, labels):
+        values = tuple(labels[label] for label in self.labels)
+        keys = self._keys.get(values)
+        if keys is None:
+            keys = self._keys[values] = self.make_keys(values)
+        return keys
+
+    def make_keys(self, values):
+        return self.key(self.name, values)
+
+    def samples(self):
+        """Имена сэмплов, которые относятся к этой метрике."""
+        return {self.name}
+
+    def complete(self, samples):
+        """Дополняет сэмплы метрики недостающими нулевыми."""
+        return samples
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if settings.METRICS_ENABLED:
+            _file().add(self.keys(labels), amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def make_keys(self, values):
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        return (
+            [self.key(f'{self.name}_bucket', values, f'le="{bound}"')
+             for bound in bounds],
+            self.key(f'{self.name}_sum', values),
+            self.key(f'{self.name}_count', values),
+        )
+
+    def observe(self, value, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        buckets, sum_key, count_key = self.keys(labels)
+        metrics_file = _file()
+        # Корзины накопительные: значение попадает во все, начиная
+        # с первой подходящей, и всегда в +Inf.
+        for key in buckets[bisect.bisect_left(self.buckets, value):]:
+            metrics_file.add(key, 1)
+        metrics_file.add(sum_key, value)
+        metrics_file.add(count_key, 1)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        return {
+            f'{self.name}_{suffix}' for suffix in ('bucket', 'sum', 'count')}
+
+    def complete(self, samples):
+        # Корзины, в которые ещё ничего не попало, тоже нужны Prometheus.
+        count = f'{self.name}_count'
+        for key in list(samples):
+            sample, _, pairs = key.partition('{')
+            if sample != count:
+                continue
+            pairs = pairs.rstrip('}')
+            for bound in [*self.buckets, '+Inf']:
+                extra = f'le="{bound}"'
+                samples.setdefault(
+                    f'{self.name}_bucket{{{pairs},{extra}}}' if pairs
+                    else f'{self.name}_bucket{{{extra}}}', 0.0)
+        return samples
+
+
+def collect(directory=None):
+    """Сумма значений по всем файлам каталога: {ключ: значение}."""
+    directory = directory or settings.METRICS_DIR
+    totals = defaultdict(float)
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return totals
+    for name in names:
+        if not name.endswith('.db'):
+            continue
+        try:
+            with open(os.path.join(directory, name), 'rb') as source:
+                buffer = source.read()
+        except OSError:
+            continue
+        for key, offset in _parse(buffer):
+            totals[key] += _value.unpack_from(buffer, offset)[0]
+    return totals
+
+
+def _sample_order(key):
+    # Ряды одного набора меток вместе, корзины — по возрастанию le.
+    sample, _, pairs = key.partition('{')
+    le = _le.search(pairs)
+    pairs = _le.sub('', pairs.rstrip('}')).strip(',')
+    return pairs, sample, float(le.group(1)) if le else 0
+
+
+def render(totals=None):
+    """Все метрики в текстовом формате Prometheus 0.0.4."""
+    totals = collect() if totals is None else totals
+    by_sample = {
+        sample: metric for metric in REGISTRY for sample in metric.samples()}
+    grouped = defaultdict(dict)
+    for key, value in totals.items():
+        metric = by_sample.get(key.split('{', 1)[0])
+        if metric is not None:
+            grouped[metric][key] = value
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        samples = metric.complete(grouped[metric])
+        for key, value in sorted(
+                samples.items(), key=lambda item: _sample_order(item[0])):
+            lines.append(f'{key} {int(value)}' if value.is_integer()
+                         else f'{key} {value!r}')
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_LATENCY = Histogram(
+    'yatube_http_request_duration_seconds',
+    'Время ответа по URL name.', ['view'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+RESPONSES = Counter(
+    'yatube_http_responses_total',
+    'Ответы по URL name и коду статуса.', ['view', 'status'])
+DB_QUERIES = Counter(
+    'yatube_db_queries_total', 'SQL-запросы по URL name.', ['view'])
+DB_TIME = Counter(
+    'yatube_db_query_seconds_total',
+    'Время SQL-запросов по URL name.', ['view'])
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests_total',
+    'Чтения двухуровневого кэша: front_hit, shared_hit или miss.',
+    ['cache', 'result'])
+FRAGMENT_CACHE = Counter(
+    'yatube_fragment_cache_requests_total',
+    'Фрагменты шаблонов {% cachedfragment %}: hit или miss.',
+    ['fragment', 'result'])
+THUMBNAIL_TIME = Histogram(
+    'yatube_thumbnail_generation_seconds',
+    'Время создания недостающих миниатюр одной картинки.',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+UPLOAD_SIZE = Histogram(
+    'yatube_upload_size_bytes', 'Размер загруженных картинок постов.',
+    buckets=tuple(2 ** power * 1024 for power in range(4, 15)))
+
+
+class MetricsMiddleware:
+    """Время ответа, коды и SQL-запросы по URL name.
+
+    Включается настройкой METRICS_ENABLED; должен стоять первым, чтобы
+    учитывать работу остальных middleware.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        compact()
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with count_queries() as queries:
+            response = self.get_response(request)
+        match = request.resolver_match
+        # Неразобранные адреса — одной меткой, чтобы не плодить ряды.
+        view = match.view_name if match else 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - started, view=view)
+        RESPONSES.inc(view=view, status=response.status_code)
+        DB_QUERIES.inc(queries.count, view=view)
+        DB_TIME.inc(queries.duration, view=view)
+        return response
@@ -0,0 +1,206 @@
+"""Профилирование отдельных запросов к view по запросу сотрудника.
+
+Профиль снимается, если сотрудник добавил к адресу ?profile=1 или прислал
+заголовок X-Profile: 1, а также для каждого PROFILER_SAMPLE_RATE-го запроса
+(1 из N, 0 — выборка выключена). Профилируются только view из модулей
+PROFILER_VIEW_MODULES. В профиль входят статистика cProfile, SQL-запросы
+с временем, попадания и промахи кэша и время отрисовки шаблонов и тегов;
+он пишется в кольцевой буфер из PROFILER_SLOTS файлов в PROFILER_DIR и
+смотрится в админке, на странице «Профили запросов».
+"""
+import cProfile
+import fcntl
+import io
+import itertools
+import json
+import os
+import pstats
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+
+from core import render_timing
+from core.query_budget import count_queries
+
+
+class RequestProfile:
+    """Обращения к кэшу за время работы view."""
+
+    def __init__(self):
+        self.cache = []
+
+    def record_cache(self, key, hit):
+        self.cache.append((key, hit))
+
+
+def top_level_caches():
+    """Кэши из CACHES, к которым обращается код.
+
+    Общее хранилище TwoLevelCache (OPTIONS['SHARED']) не входит: обращения
+    к нему — промахи переднего кэша, и каждый считался бы дважды.
+    """
+    backends = {alias: caches[alias] for alias in settings.CACHES}
+    nested = {
+        getattr(backend, 'shared_alias', None)
+        for backend in backends.values()}
+    return [
+        backend for alias, backend in backends.items()
+        if alias not in nested]
+
+
+@contextmanager
+def watch_caches(profile):
+    """Считает попадания и промахи get/get_many кэшей этого потока."""
+    missing = object()
+    backends = top_level_caches()
+    for backend in backends:
+        def get(key, default=None, version=None, _get=backend.get):
+            value = _get(key, missing, version=version)
+            profile.record_cache(key, value is not missing)
+            return default if value is missing else value
+
+        def get_many(keys, version=None, _get_many=backend.get_many):
+            found = _get_many(keys, version=version)
+            for key in keys:
+                profile.record_cache(key, key in found)
+            return found
+
+        # Экземпляры бэкендов свои у каждого потока: подмена не задевает
+        # параллельные запросы.
+        backend.get, backend.get_many = get, get_many
+    try:
+        yield
+    finally:
+        for backend in backends:
+            del backend.get, backend.get_many
+
+
+class ProfileStore:
+    """Кольцевой буфер профилей: файлы slot-N.json в PROFILER_DIR."""
+
+    def __init__(self, directory=None, slots=None):
+        self.directory = directory or settings.PROFILER_DIR
+        self.slots = slots or settings.PROFILER_SLOTS
+
+    def _path(self, profile_id):
+        return os.path.join(
+            self.directory, f'slot-{profile_id % self.slots}.json')
+
+    def _next_id(self):
+        # Счётчик общий для всех процессов: под файловой блокировкой.
+        with open(os.path.join(self.directory, 'counter'), 'a+') as counter:
+            fcntl.flock(counter, fcntl.LOCK_EX)
+            counter.seek(0)
+            profile_id = int(counter.read() or 0) + 1
+            counter.seek(0)
+            counter.truncate()
+            counter.write(str(profile_id))
+        return profile_id
+
+    def save(self, record):
+        os.makedirs(self.directory, exist_ok=True)
+        record['id'] = self._next_id()
+        path = self._path(record['id'])
+        with open(f'{path}.tmp', 'w') as output:
+            json.dump(record, output, ensure_ascii=False)
+        os.replace(f'{path}.tmp', path)
+        return record['id']
+
+    def load(self, profile_id):
+        try:
+            with open(self._path(profile_id)) as source:
+                record = json.load(source)
+        except (OSError, ValueError):
+            return None
+        # Слот мог быть уже перезаписан более новым профилем.
+        return record if record.get('id') == profile_id else None
+
+    def recent(self):
+        records = []
+        for slot in range(self.slots):
+            try:
+                with open(os.path.join(
+                        self.directory, f'slot-{slot}.json')) as source:
+                    records.append(json.load(source))
+            except (OSError, ValueError):
+                continue
+        return sorted(records, key=lambda record: -record['id'])
+
+
+class RequestProfilerMiddleware:
+    """Снимает профиль view по запросу сотрудника или по выборке.
+
+    Включается настройкой PROFILER_ENABLED; должен стоять после
+    AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILER_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.requests = itertools.count(1)
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def wanted(self, request):
+        if request.user.is_staff and (
+                request.GET.get('profile') or request.META.get(
+                    'HTTP_X_PROFILE')):
+            return True
+        rate = settings.PROFILER_SAMPLE_RATE
+        return bool(rate) and next(self.requests) % rate == 0
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if view_func.__module__ not in settings.PROFILER_VIEW_MODULES:
+            return None
+        if not self.wanted(request):
+            return None
+        profile = RequestProfile()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with count_queries() as queries, watch_caches(profile), \
+                render_timing.collect() as timings:
+            profiler.enable()
+            try:
+                response = view_func(request, *view_args, **view_kwargs)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - started
+        response['X-Profile-Id'] = ProfileStore().save(self.record(
+            request, response, duration, profiler, queries, profile, timings))
+        return response
+
+    def record(self, request, response, duration, profiler, queries,
+               profile, timings):
+        stats = io.StringIO()
+        pstats.Stats(profiler, stream=stats).sort_stats(
+            'cumulative').print_stats(settings.PROFILER_TOP_FUNCTIONS)
+        hits = sum(hit for _, hit in profile.cache)
+        return {
+            'created': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': request.resolver_match.view_name,
+            'user': request.user.get_username(),
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'sql': [
+                {'sql': sql, 'ms': round(seconds * 1000, 3)}
+                for sql, seconds in zip(queries.queries, queries.durations)
+            ],
+            'sql_ms': round(queries.duration * 1000, 2),
+            'cache': {
+                'hits': hits,
+                'misses': len(profile.cache) - hits,
+                'keys': [
+                    {'key': key, 'hit': hit} for key, hit in profile.cache],
+            },
+            'templates': timings.rows('templates'),
+            'tags': timings.rows('tags'),
+            'profile': stats.getvalue(),
+        }
@@ -0,0 +1,87 @@
+"""Учёт SQL-запросов на запрос к view и бюджеты по URL name."""
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('yatube.query_budget')
+
+
+class QueryCounter:
+    """execute_wrapper, считающий запросы и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+        self.durations = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            self.queries.append(sql)
+            self.durations.append(elapsed)
+
+
+@contextmanager
+def count_queries():
+    """Считает запросы ко всем базам внутри блока."""
+    counter = QueryCounter()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(
+                connections[alias].execute_wrapper(counter))
+        yield counter
+
+
+@contextmanager
+def query_budget(url_name, budget=None):
+    """Проваливает тест, если блок превысил бюджет запросов url_name.
+
+    with query_budget('posts:index'):
+        client.get(reverse('posts:index'))
+    """
+    if budget is None:
+        budget = settings.QUERY_BUDGETS[url_name]
+    with count_queries() as counter:
+        yield counter
+    assert counter.count <= budget, (
+        f'{url_name}: {counter.count} SQL-запросов при бюджете {budget}:\n'
+        + '\n'.join(counter.queries)
+    )
+
+
+class QueryBudgetMiddleware:
+    """Пишет в лог view, превысившие бюджет из settings.QUERY_BUDGETS.
+
+    Включается настройкой QUERY_BUDGET_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with count_queries() as counter:
+            response = self.get_response(request)
+        match = request.resolver_match
+        url_name = match.view_name if match else None
+        budget = settings.QUERY_BUDGETS.get(url_name)
+        logger.debug(
+            '%s %s: %d SQL-запросов, %.1f мс', request.method, url_name,
+            counter.count, counter.duration * 1000)
+        if budget is not None and counter.count > budget:
+            logger.warning(
+                '%s %s: %d SQL-запросов (%.1f мс) при бюджете %d',
+                request.method, url_name, counter.count,
+                counter.duration * 1000, budget)
+        return response
@@ -0,0 +1,200 @@
+"""Время отрисовки шаблонов и шаблонных тегов.
+
+Template._render и Node.render_annotated один раз оборачиваются замером;
+пока в потоке никто не собирает статистику (collect()), обёртка только
+проверяет thread-local. Для каждого шаблона и тега копятся число вызовов,
+полное время (вместе с вложенными) и собственное время (без вложенных
+шаблонов и тегов): полное показывает, что даст кэш фрагмента, собственное —
+где тратится время на самом деле. _render, а не render, — чтобы видеть и
+родительские шаблоны из {% extends %}.
+
+RenderTimingMiddleware отдаёт итоги запроса в заголовке Server-Timing и
+в лог yatube.render_timing и копит их по URL name для страницы в админке.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template.base import Node, Template, TokenType
+
+logger = logging.getLogger('yatube.render_timing')
+
+_state = threading.local()
+_patch_lock = threading.Lock()
+_originals = {}
+
+
+class RenderTimings:
+    """Вызовы, полное и собственное время по шаблонам и тегам."""
+
+    def __init__(self):
+        self.templates = {}
+        self.tags = {}
+        self.total = 0.0
+
+    def record(self, kind, name, total, own):
+        rows = getattr(self, kind)
+        calls, summed, summed_own = rows.get(name, (0, 0.0, 0.0))
+        rows[name] = (calls + 1, summed + total, summed_own + own)
+
+    def merge(self, other):
+        for kind in ('templates', 'tags'):
+            rows = getattr(self, kind)
+            for name, (calls, total, own) in getattr(other, kind).items():
+                old_calls, old_total, old_own = rows.get(name, (0, 0.0, 0.0))
+                rows[name] = (
+                    old_calls + calls, old_total + total, old_own + own)
+        self.total += other.total
+
+    def rows(self, kind, requests=1):
+        """Строки для вывода, по убыванию собственного времени, в мс."""
+        return sorted((
+            {
+                'name': name,
+                'calls': calls / requests,
+                'ms': total * 1000 / requests,
+                'own_ms': own * 1000 / requests,
+            }
+            for name, (calls, total, own) in getattr(self, kind).items()
+        ), key=lambda row: -row['own_ms'])
+
+    def server_timing(self, items):
+        """Значение заголовка Server-Timing: всё и самые долгие шаблоны."""
+        heaviest = sorted(
+            [('template', row) for row in self.rows('templates')]
+            + [('tag', row) for row in self.rows('tags')],
+            key=lambda item: -item[1]['own_ms'])[:items]
+        return ', '.join([f'render;dur={self.total * 1000:.2f}'] + [
+            f'{kind};desc="{row["name"]} x{row["calls"]:g}";'
+            f'dur={row["own_ms"]:.2f}'
+            for kind, row in heaviest
+        ])
+
+
+def _timed(kind, name, render, *args):
+    started = time.perf_counter()
+    stack = _state.stack
+    stack.append(0.0)
+    try:
+        return render(*args)
+    finally:
+        total = time.perf_counter() - started
+        children = stack.pop()
+        if stack:
+            stack[-1] += total
+        for timings in _state.collectors:
+            timings.record(kind, name, total, total - children)
+            if not stack:
+                timings.total += total
+
+
+def _render_template(self, context):
+    if not getattr(_state, 'collectors', None):
+        return _originals['template'](self, context)
+    return _timed(
+        'templates', self.origin.template_name or self.name or '<string>',
+        _originals['template'], self, context)
+
+
+def _render_node(self, context):
+    token = getattr(self, 'token', None)
+    if (not getattr(_state, 'collectors', None) or token is None
+            or token.token_type != TokenType.BLOCK):
+        return _originals['node'](self, context)
+    return _timed(
+        'tags', token.contents.split(None, 1)[0], _originals['node'],
+        self, context)
+
+
+def instrument():
+    """Один раз оборачивает отрисовку шаблонов и тегов замером."""
+    with _patch_lock:
+        if not _originals:
+            _originals['template'] = Template._render
+            _originals['node'] = Node.render_annotated
+            Template._render = _render_template
+            Node.render_annotated = _render_node
+
+
+@contextmanager
+def collect():
+    """Собирает время отрисовки в этом потоке внутри блока.
+
+    Блоки можно вкладывать: каждый получает все замеры, сделанные
+    за время его работы.
+    """
+    instrument()
+    timings = RenderTimings()
+    if not getattr(_state, 'collectors', None):
+        _state.collectors = []
+        _state.stack = []
+    _state.collectors.append(timings)
+    try:
+        yield timings
+    finally:
+        _state.collectors.remove(timings)
+
+
+class UrlTotals:
+    """Накопленное время отрисовки по URL name в этом процессе."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.timings = {}
+        self.requests = {}
+
+    def add(self, url_name, timings):
+        with self.lock:
+            self.timings.setdefault(url_name, RenderTimings()).merge(timings)
+            self.requests[url_name] = self.requests.get(url_name, 0) + 1
+
+    def report(self):
+        """[(url name, запросов, среднее на запрос, шаблоны, теги)]."""
+        with self.lock:
+            return [
+                (url_name, self.requests[url_name],
+                 timings.total * 1000 / self.requests[url_name],
+                 timings.rows('templates', self.requests[url_name]),
+                 timings.rows('tags', self.requests[url_name]))
+                for url_name, timings in sorted(
+                    self.timings.items(), key=lambda item: -item[1].total)
+            ]
+
+
+totals = UrlTotals()
+
+
+class RenderTimingMiddleware:
+    """Меряет отрисовку шаблонов каждого запроса.
+
+    Включается настройкой RENDER_TIMING_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not settings.RENDER_TIMING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        instrument()
+
+    def __call__(self, request):
+        with collect() as timings:
+            response = self.get_response(request)
+        if not timings.templates:
+            return response
+        match = request.resolver_match
+        url_name = match.view_name if match else None
+        totals.add(url_name, timings)
+        response['Server-Timing'] = timings.server_timing(
+            settings.RENDER_TIMING_HEADER_ITEMS)
+        logger.debug(
+            '%s %s: отрисовка %.1f мс; %s', request.method, url_name,
+            timings.total * 1000, '; '.join(
+                f'{row["name"]} x{row["calls"]:g} {row["own_ms"]:.1f} мс'
+                for row in timings.rows('templates')))
+        return response
@@ -0,0 +1,136 @@
+import json
+import re
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from core.cache import get_or_compute
+from core.db_routers import replica
+from core.metrics import FRAGMENT_CACHE
+
+register = template.Library()
+
+# Переменная контекста: идёт отрисовка фрагмента, который попадёт в кэш.
+RENDERING = '_cachedfragment'
+# Метка {% uncached %} в кэшированном тексте. Текст постов экранируется,
+# поэтому пользователь не может подделать метку.
+HOLE = re.compile(r'<!--uncached (.*?)-->')
+
+
+def _render_hole(template_name, values, context):
+    with context.push(values):
+        return context.template.engine.get_template(
+            template_name).render(context)
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        key = make_template_fragment_key(
+            self.fragment_name,
+            [var.resolve(context) for var in self.vary_on]
+        )
+        computed = []
+
+        def compute():
+            computed.append(True)
+            with context.push({RENDERING: True}):
+                return self.nodelist.render(context)
+
+        if replica() is None:
+            content = get_or_compute(
+                key, compute, settings.FRAGMENT_CACHE_TIMEOUT)
+        else:
+            # Реплика может отставать от версий в ключе, которые уже
+            # сдвинула запись в default: отрендеренный с неё фрагмент
+            # не кладём в кэш, иначе он жил бы под свежим ключом.
+            content = cache.get(key)
+            if content is None:
+                content = compute()
+        FRAGMENT_CACHE.inc(
+            fragment=self.fragment_name,
+            result='miss' if computed else 'hit')
+        if context.get(RENDERING):
+            # Вложенный фрагмент: метки заполнит внешний.
+            return content
+        return HOLE.sub(
+            lambda match: _render_hole(*json.loads(match.group(1)), context),
+            content)
+
+
+class UncachedNode(template.Node):
+    def __init__(self, template_name, extra):
+        self.template_name = template_name
+        self.extra = extra
+
+    def render(self, context):
+        values = {
+            name: var.resolve(context) for name, var in self.extra.items()}
+        if not context.get(RENDERING):
+            return _render_hole(self.template_name, values, context)
+        # «>» экранирован, и метка не закроется внутри значений.
+        return '<!--uncached {}-->'.format(json.dumps(
+            [self.template_name, values]).replace('>', '\\u003e'))
+
+
+@register.tag
+def cachedfragment(parser, token):
+    """Кэширует фрагмент шаблона с защитой от одновременного пересчёта.
+
+    {% cachedfragment 'name' var1 var2 %} ... {% endcachedfragment %}
+
+    Время жизни берётся из settings.FRAGMENT_CACHE_TIMEOUT; свежесть
+    обеспечивается версиями в vary_on, а не коротким таймаутом. Запрос,
+    читающий с реплики, берёт готовый фрагмент, но свой не сохраняет.
+    """
+    nodelist = parser.parse(('endcachedfragment',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} requires a fragment name')
+    return CachedFragmentNode(
+        nodelist,
+        bits[1].strip('\'"'),
+        [parser.compile_filter(bit) for bit in bits[2:]]
+    )
+
+
+@register.tag
+def uncached(parser, token):
+    """Шаблон, который отрисовывается заново при каждом показе фрагмента.
+
+    {% uncached 'includes/button.html' name=value ... %}
+
+    Внутри {% cachedfragment %} в кэш попадает только метка с именем
+    шаблона и значениями (числа и строки), а шаблон отрисовывается
+    с ними и текущим контекстом (user и т.п.) при каждом показе: общий
+    для всех фрагмент может содержать кнопки конкретного пользователя.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} requires a template name')
+    extra = template.base.token_kwargs(bits[2:], parser)
+    if len(extra) != len(bits) - 2:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} accepts only name=value arguments')
+    return UncachedNode(bits[1].strip('\'"'), extra)
+
+
+@register.filter
+def page_key(page_obj):
+    """Часть ключа фрагмента от страницы пагинатора.
+
+    Номер обычной страницы или разобранный курсор, а не query string
+    запроса: посторонние параметры (?x=1, ?x=2, …) не плодят записей
+    в кэше, а некорректные номера и курсоры попадают в ключ той
+    страницы, которая показана вместо них.
+    """
+    return getattr(page_obj, 'cursor_key', page_obj.number)
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('', views.profile_list, name='profile_list'),
+    path('render/', views.render_timing, name='render_timing'),
+    path('<int:profile_id>/', views.profile_detail, name='profile_detail'),
+]
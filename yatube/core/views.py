@@ -1,5 +1,12 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
 
+from core import metrics
+from core.profiling import ProfileStore
+from core.render_timing import totals
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -7,3 +14,41 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def profile_list(request):
+    return render(request, 'core/profile_list.html', {
+        'profiles': ProfileStore().recent(),
+        'title': 'Профили запросов',
+    })
+
+
+@staff_member_required
+def profile_detail(request, profile_id):
+    profile = ProfileStore().load(profile_id)
+    if profile is None:
+        raise Http404('Профиль уже вытеснен из буфера')
+    return render(request, 'core/profile_detail.html', {
+        'profile': profile,
+        'title': f'Профиль №{profile_id}',
+    })
+
+
+@staff_member_required
+def render_timing(request):
+    return render(request, 'core/render_timing.html', {
+        'urls': totals.report(),
+        'title': 'Отрисовка шаблонов по URL',
+    })
+
+
+def prometheus_metrics(request):
+    # Prometheus ходит с адресов METRICS_ALLOWED_IPS, сотрудник — откуда
+    # угодно, но со своей сессией.
+    if (request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS
+            and not request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,37 @@
+"""Общие помощники команд нагрузочных замеров."""
+import os
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(int(share * len(ordered)), len(ordered) - 1)]
+
+
+def split_path(path, alias):
+    """Файл отдельной базы alias рядом с основным: db.sqlite3 → db-alias."""
+    root, extension = os.path.splitext(path)
+    return f'{root}-{alias}{extension}'
+
+
+def database_aliases():
+    """default и базы из DATABASE_SPLIT_MODELS."""
+    return [DEFAULT_DB_ALIAS,
+            *sorted(set(settings.DATABASE_SPLIT_MODELS.values()))]
+
+
+def use_database(path):
+    """Переключает default на файл SQLite path, отдельные базы — рядом."""
+    for alias in database_aliases():
+        connections[alias].close()
+        connections[alias].settings_dict['NAME'] = (
+            path if alias == DEFAULT_DB_ALIAS else split_path(path, alias))
+
+
+def migrate():
+    """Создаёт схему во всех базах из database_aliases()."""
+    for alias in database_aliases():
+        call_command('migrate', database=alias, verbosity=0)
@@ -0,0 +1,42 @@
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'fragments:version:{}'
+
+
+def _key(scope):
+    return VERSION_KEY.format(scope)
+
+
+def versions(*scopes):
+    """Строка версий для ключа фрагмента: меняется при любом bump()."""
+    keys = [_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Начальное значение из часов: если ключ версии вытеснят,
+            # новый отсчёт не совпадёт со старыми фрагментами.
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return '.'.join(str(found[key]) for key in keys)
+
+
+def bump(*scopes):
+    """Инвалидирует все фрагменты, зависящие от scopes."""
+    for scope in scopes:
+        try:
+            cache.incr(_key(scope))
+        except ValueError:
+            cache.add(_key(scope), time.time_ns(), None)
+
+
+def card_scopes(post):
+    """Scope карточки поста: её картинка, автор и группа."""
+    return (f'card_post:{post.id}', f'card_author:{post.author_id}',
+            f'card_group:{post.group_id}')
+
+
+def post_scopes(post):
+    return ('index', f'group:{post.group_id}', f'profile:{post.author_id}',
+            f'post:{post.id}')
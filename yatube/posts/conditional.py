@@ -0,0 +1,69 @@
+"""Валидаторы ETag для условных GET-запросов к страницам постов.
+
+ETag собирается из версий scope фрагментного кэша (posts.caching): они
+меняются при любой правке, удалении поста, комментария, группы или автора,
+поэтому 304 не отдаёт устаревшую страницу. Лента подписок своей версии
+не имеет — иначе каждая правка поста сдвигала бы версии всех лент с ним.
+Её ETag строится по самой странице ленты (posts.feeds.page): id постов
+на ней, их версии post:<id>, наличие соседних страниц и feed_count.
+Новый, удалённый или отписанный пост меняет состав страницы или счётчик,
+правка и готовая миниатюра — версию поста. Страница зависит
+от пользователя (шапка, кнопки подписки), поэтому его id, версия его
+подписок и полный путь с курсором тоже входят в ETag.
+
+Страница, прочитанная с реплики, ETag не получает: реплика может ещё
+не видеть запись, версию которой ETag уже содержит, и 304 закрепил бы
+у клиента устаревшую страницу.
+"""
+import hashlib
+
+from core.db_routers import replica
+
+from . import caching, feeds, following, recommendations
+from .models import Group, Post, User
+
+
+def _etag(request, *parts):
+    if replica() is not None:
+        return None
+    key = '|'.join(map(str, (
+        request.user.pk, request.get_full_path(), *parts)))
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def index(request):
+    return _etag(request, caching.versions(
+        'index', 'groups', 'authors', *following.scopes(request.user)))
+
+
+def group_posts(request, slug):
+    group_id = Group.objects.filter(
+        slug=slug).values_list('id', flat=True).first()
+    return _etag(request, group_id, caching.versions(
+        f'group:{group_id}', 'authors', *following.scopes(request.user)))
+
+
+def profile(request, username):
+    author_id = User.objects.filter(
+        username=username).values_list('id', flat=True).first()
+    return _etag(request, author_id, caching.versions(
+        f'profile:{author_id}', 'groups', 'authors', recommendations.SCOPE,
+        *following.scopes(request.user)))
+
+
+def post_detail(request, post_id):
+    author_id = Post.objects.filter(
+        id=post_id).values_list('author_id', flat=True).first()
+    return _etag(request, author_id, caching.versions(
+        f'post:{post_id}', f'profile:{author_id}', 'groups', 'authors'))
+
+
+def follow_index(request):
+    page = feeds.page(request)
+    post_ids = [post.id for post in page]
+    return _etag(
+        request, request.user.stats.feed_count, page.has_next(),
+        page.has_previous(), *post_ids, caching.versions(
+            'groups', 'authors', recommendations.SCOPE,
+            *following.scopes(request.user),
+            *(f'post:{post_id}' for post_id in post_ids)))
@@ -0,0 +1,95 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import router
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.db_routers import replica
+
+from .models import (
+    Comment, FeedEntry, Follow, Group, Post, User, UserStats)
+
+POSTS_TOTAL_KEY = 'posts:total'
+# Параметров в одном запросе SQLite — не больше 999.
+BATCH_SIZE = 500
+
+
+def change(model, pk, field, delta):
+    """Атомарно сдвигает счётчик field у записи pk на delta."""
+    if pk is not None:
+        model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def change_many(model, pks, field, delta):
+    """change() для нескольких записей одним UPDATE."""
+    if pks:
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def posts_total():
+    """Приблизительное общее число постов из кэша.
+
+    Число с отстающей реплики в кэш не кладётся: его уже не поправили бы
+    change_posts_total() следующих публикаций.
+    """
+    total = cache.get(POSTS_TOTAL_KEY)
+    if total is None:
+        total = Post.objects.count()
+        if replica() is None:
+            cache.set(POSTS_TOTAL_KEY, total, None)
+    return total
+
+
+def change_posts_total(delta):
+    try:
+        cache.incr(POSTS_TOTAL_KEY, delta)
+    except ValueError:
+        # Ключа нет в кэше: значение посчитается при следующем чтении.
+        pass
+
+
+def count_of(model, field, **values):
+    """Подзапрос «количество строк model, где field = OuterRef('pk')»."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}, **values).order_by(
+        ).values(field).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()
+    ), 0)
+
+
+def fill(model, field, source, source_field):
+    """model.field = число строк source, где source_field = pk записи.
+
+    В одной базе — одним UPDATE с подзапросом. Если source лежит в другой
+    базе (DATABASE_SPLIT_MODELS), числа считаются там GROUP BY, а записи
+    обновляются пачками с одинаковым значением.
+    """
+    if router.db_for_read(source) == router.db_for_write(model):
+        model.objects.update(**{field: count_of(source, source_field)})
+        return
+    pks_by_total = defaultdict(list)
+    for pk, total in source.objects.order_by().values_list(
+            source_field).annotate(Count('pk')).iterator():
+        pks_by_total[total].append(pk)
+    model.objects.update(**{field: 0})
+    for total, pks in pks_by_total.items():
+        for start in range(0, len(pks), BATCH_SIZE):
+            model.objects.filter(
+                pk__in=pks[start:start + BATCH_SIZE]).update(**{field: total})
+
+
+def recount():
+    """Пересчитывает все денормализованные счётчики по таблицам."""
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in User.objects.filter(
+            stats__isnull=True).values_list('id', flat=True)],
+        ignore_conflicts=True
+    )
+    fill(UserStats, 'posts_count', Post, 'author')
+    fill(UserStats, 'followers_count', Follow, 'author')
+    fill(UserStats, 'following_count', Follow, 'user')
+    fill(UserStats, 'feed_count', FeedEntry, 'user')
+    fill(Group, 'posts_count', Post, 'group')
+    fill(Post, 'comments_count', Comment, 'post')
+    cache.delete(POSTS_TOTAL_KEY)
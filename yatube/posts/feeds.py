@@ -0,0 +1,147 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import F, OuterRef, Q, Subquery
+
+from .counters import count_of
+from .models import FeedEntry, Follow, Post, User, UserStats
+from .paginators import CursorPaginator, get_page
+
+BATCH_SIZE = 500
+# Четыре параметра на пользователя в условии DELETE, а SQLite принимает
+# не больше 999 параметров в запросе.
+TRIM_BATCH_SIZE = 200
+
+
+def page(request):
+    """Страница ленты подписок пользователя запроса.
+
+    Выбирается один раз на запрос: по её постам считается ETag
+    (posts.conditional.follow_index), и она же отрисовывается.
+    Курсор идёт по записям FeedEntry, а не по постам: ключ (pub_date, id)
+    записи читается прямо из индекса (user, -pub_date), к которому SQLite
+    неявно дописывает id по возрастанию, поэтому глубокие страницы
+    не сортируют всю ленту.
+    """
+    feed_page = getattr(request, '_feed_page', None)
+    if feed_page is None:
+        feed_page = request._feed_page = _page(request)
+    return feed_page
+
+
+def _page(request):
+    cursor = request.GET.get('cursor')
+    if cursor is None and settings.POSTS_PAGINATION != 'cursor':
+        return get_page(request, Post.objects.filter(
+            feed_entries__user=request.user
+        ).select_related('author', 'group').order_by(
+            '-feed_entries__pub_date'),
+            count=request.user.stats.feed_count)
+    feed_page = CursorPaginator(
+        FeedEntry.objects.filter(user=request.user).select_related(
+            'post__author', 'post__group'),
+        settings.POSTS_PER_PAGE, ordering=('-pub_date', 'id')
+    ).get_page(cursor)
+    feed_page.object_list = [entry.post for entry in feed_page.object_list]
+    return feed_page
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Подписчики берутся пачками: пачка лент получает запись одним INSERT,
+    счётчики feed_count — один UPDATE, и ленты сразу обрезаются
+    до FEED_LENGTH.
+    """
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True).iterator(chunk_size=BATCH_SIZE)
+    while True:
+        user_ids = list(islice(followers, BATCH_SIZE))
+        if not user_ids:
+            return
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(
+                    user_id=user_id, post_id=post.id, pub_date=post.pub_date)
+                for user_id in user_ids
+            ],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True
+        )
+        UserStats.objects.filter(user_id__in=user_ids).update(
+            feed_count=F('feed_count') + 1)
+        trim(user_ids)
+
+
+def backfill(user_id, author_ids):
+    """Добавляет в ленту последние посты авторов после подписки."""
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in Post.objects.filter(
+                author_id__in=author_ids
+            ).values_list('id', 'pub_date')[:settings.FEED_LENGTH]
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    trim([user_id])
+    recount(user_id)
+
+
+def remove_authors(user_id, author_ids):
+    """Убирает из ленты посты авторов после отписки."""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id__in=author_ids).delete()
+    recount(user_id)
+
+
+def remove_post(post_id):
+    """Уменьшает feed_count у лент, откуда CASCADE удалит пост."""
+    UserStats.objects.filter(user_id__in=FeedEntry.objects.filter(
+        post_id=post_id).values('user_id')
+    ).update(feed_count=F('feed_count') - 1)
+
+
+def trim(user_ids):
+    """Оставляет в лентах user_ids только FEED_LENGTH самых свежих записей.
+
+    Граница — первая лишняя запись ленты в порядке (-pub_date, id), его
+    обслуживает индекс (user, -pub_date) с неявным id в конце. Всё, что
+    не новее границы, удаляется одним DELETE на пачку пользователей,
+    и в ленте остаётся ровно FEED_LENGTH записей.
+    """
+    cutoff_ids = User.objects.filter(id__in=user_ids).annotate(
+        cutoff=Subquery(FeedEntry.objects.filter(
+            user=OuterRef('pk')
+        ).order_by('-pub_date', 'id').values('id')[
+            settings.FEED_LENGTH:settings.FEED_LENGTH + 1])
+    ).values_list('cutoff', flat=True)
+    cutoffs = list(FeedEntry.objects.filter(
+        id__in=[cutoff for cutoff in cutoff_ids if cutoff]
+    ).values_list('user_id', 'pub_date', 'id'))
+    for start in range(0, len(cutoffs), TRIM_BATCH_SIZE):
+        batch = cutoffs[start:start + TRIM_BATCH_SIZE]
+        stale = Q()
+        for user_id, pub_date, entry_id in batch:
+            stale |= Q(user_id=user_id) & (
+                Q(pub_date__lt=pub_date)
+                | Q(pub_date=pub_date, id__gte=entry_id))
+        FeedEntry.objects.filter(stale).delete()
+        UserStats.objects.filter(
+            user_id__in=[user_id for user_id, _, _ in batch]
+        ).update(feed_count=settings.FEED_LENGTH)
+
+
+def recount(user_id):
+    """Пересчитывает feed_count по ленте: она не длиннее FEED_LENGTH."""
+    UserStats.objects.filter(user_id=user_id).update(
+        feed_count=count_of(FeedEntry, 'user'))
+
+
+def rebuild(user_id):
+    """Собирает ленту пользователя заново по его подпискам."""
+    FeedEntry.objects.filter(user_id=user_id).delete()
+    backfill(user_id, list(Follow.objects.filter(
+        user_id=user_id).values_list('author_id', flat=True)))
@@ -0,0 +1,79 @@
+"""Кэш id авторов, на которых подписан пользователь.
+
+Набор хранится в общем кэше упакованным массивом беззнаковых int (4 байта
+на автора) под ключом с версией scope follows:<id пользователя>; подписка
+и отписка сдвигают версию и сразу кладут новый набор. На запрос набор
+распаковывается один раз и запоминается на объекте пользователя, так что
+флаг «подписан» на профиле и кнопки у каждого поста в лентах не делают
+запросов к базе.
+"""
+from array import array
+
+from django.core.cache import cache
+from django.db import router, transaction
+
+from core.db_routers import replica
+
+from . import caching
+from .models import Follow
+
+KEY = 'following:{}:{}'
+
+
+def scope(user_id):
+    return f'follows:{user_id}'
+
+
+def scopes(user):
+    """Scope подписок для версий страниц с кнопками подписки."""
+    return (scope(user.pk),) if user.is_authenticated else ()
+
+
+def _key(user_id):
+    return KEY.format(user_id, caching.versions(scope(user_id)))
+
+
+def load(user_id):
+    """Читает набор из базы и кладёт его в кэш под текущей версией.
+
+    Набор, прочитанный с реплики, в кэш не попадает: она может не видеть
+    подписку, которая уже сдвинула версию.
+    """
+    ids = array('I', sorted(Follow.objects.filter(
+        user_id=user_id).values_list('author_id', flat=True)))
+    if replica() is None:
+        cache.set(_key(user_id), ids.tobytes(), None)
+    return frozenset(ids)
+
+
+def authors(user):
+    """frozenset id авторов, на которых подписан user."""
+    if not user.is_authenticated:
+        return frozenset()
+    ids = getattr(user, '_following', None)
+    if ids is None:
+        packed = cache.get(_key(user.id))
+        if packed is None:
+            ids = load(user.id)
+        else:
+            ids = array('I')
+            ids.frombytes(packed)
+            ids = frozenset(ids)
+        user._following = ids
+    return ids
+
+
+def changed(user_id):
+    """Обновляет набор после подписки или отписки user_id.
+
+    Версия сдвигается сразу и ещё раз после коммита: набор, собранный
+    читателем между ними по базе без новой строки, останется под
+    промежуточной версией, которую уже никто не прочтёт.
+    """
+    caching.bump(scope(user_id))
+
+    def refresh():
+        caching.bump(scope(user_id))
+        load(user_id)
+
+    transaction.on_commit(refresh, using=router.db_for_write(Follow))
@@ -1,6 +1,8 @@
 from django import forms
 
+from . import thumbnails
 from .models import Post, Comment
+from .uploads import check_image
 
 
 class PostForm(forms.ModelForm):
@@ -9,6 +11,29 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if image and image != self.initial.get('image'):
+            # ImageField читает только заголовок; пиксели декодирует
+            # downscale, поэтому лимиты проверяются до него.
+            check_image(image)
+            # Хранить оригинал больше самого крупного варианта незачем.
+            image = thumbnails.downscale(image)
+        return image
+
+    def clean(self):
+        cleaned_data = super().clean()
+        upload = self.files.get(self.add_prefix('image'))
+        if upload is not None and 'image' in self.errors:
+            # Файл сверх лимита обрезан при загрузке, и ImageField его
+            # не разобрал: вместо «не картинка» показываем причину.
+            try:
+                check_image(upload)
+            except forms.ValidationError as error:
+                del self.errors['image']
+                self.add_error('image', error)
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
 
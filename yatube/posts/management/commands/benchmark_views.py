@@ -0,0 +1,216 @@
+import itertools
+import json
+import os
+import platform
+import random
+import time
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.benchmarks import migrate, percentile, use_database
+from posts.models import Follow, Group, Post, User
+from posts.urls import app_name, urlpatterns
+
+SAMPLE = 100
+
+
+class Command(BaseCommand):
+    help = ('Засевает базы заданных размеров и измеряет p50/p95 времени '
+            'ответа и число SQL-запросов для каждого URL приложения posts; '
+            'результаты пишутся в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+            help='число постов в базе')
+        parser.add_argument(
+            '--requests', type=int, default=100,
+            help='запросов на каждое имя URL')
+        parser.add_argument(
+            '--cache', choices=['warm', 'cold'], default='warm',
+            help='cold очищает кэш перед каждым запросом')
+        parser.add_argument(
+            '--data-dir', default=os.path.join(settings.BASE_DIR, 'bench'),
+            help='каталог баз; готовые базы переиспользуются')
+        parser.add_argument(
+            '--follow-batch', type=int, default=20,
+            help='авторов в одном запросе follow_batch')
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.follow_batch = options['follow_batch']
+        os.makedirs(options['data_dir'], exist_ok=True)
+        original = connection.settings_dict['NAME']
+        results = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'cache': options['cache'],
+            'requests': options['requests'],
+            'sizes': {},
+        }
+        try:
+            for size in options['sizes']:
+                path = os.path.join(
+                    options['data_dir'], f'posts-{size}.sqlite3')
+                self.prepare(path, size, options['seed'])
+                results['sizes'][size] = self.measure(options)
+                self.report(size, results['sizes'][size])
+        finally:
+            use_database(original)
+        with open(options['output'], 'w') as output:
+            json.dump(results, output, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты записаны в {options["output"]}')
+
+    def prepare(self, path, size, seed):
+        exists = os.path.exists(path)
+        use_database(path)
+        if not exists:
+            self.stdout.write(f'Засеваю базу на {size} постов…')
+            migrate()
+            call_command(
+                'seed_data', posts=size, seed=seed, stdout=StringIO())
+        cache.clear()
+
+    def cases(self):
+        """Функции «клиент, метод, url, данные» по именам URL posts."""
+        posts = list(Post.objects.values_list('id', 'author_id').order_by(
+            '?')[:SAMPLE])
+        authors = dict(User.objects.filter(
+            id__in={author_id for _, author_id in posts}
+        ).values_list('id', 'username'))
+        groups = list(Group.objects.values_list('slug', flat=True))
+        reader = User.objects.order_by('-stats__following_count').first()
+        words = Post.objects.order_by('?').first().text.split()
+        readers = {reader.id: self.login(reader)}
+        guest = Client()
+
+        def author_client(author_id):
+            if author_id not in readers:
+                readers[author_id] = self.login(
+                    User.objects.get(id=author_id))
+            return readers[author_id]
+
+        def any_post():
+            return self.random.choice(posts)
+
+        def follow(name, following):
+            def case():
+                # Подписка и отписка меняют состояние: готовим его заранее,
+                # вне замера, чтобы каждый запрос делал настоящую работу.
+                _, author_id = any_post()
+                if author_id == reader.id:
+                    author_id = posts[0][1]
+                subscription = Follow.objects.filter(
+                    user=reader, author_id=author_id)
+                if following:
+                    Follow.objects.get_or_create(
+                        user=reader, author_id=author_id)
+                else:
+                    subscription.delete()
+                return readers[reader.id], 'post', reverse(
+                    f'posts:{name}',
+                    kwargs={'username': authors[author_id]}), {}
+            return case
+
+        # Пакет подписывается и отписывается по очереди; перед замером
+        # подписок на него нет, поэтому каждый запрос меняет весь пакет.
+        batch = list(User.objects.exclude(id=reader.id).order_by(
+            'id')[:self.follow_batch])
+        Follow.objects.unfollow(reader, [author.id for author in batch])
+        batch_actions = itertools.cycle(('follow', 'unfollow'))
+
+        def follow_batch():
+            return readers[reader.id], 'post', reverse('posts:follow_batch'), {
+                'action': next(batch_actions),
+                'username': [author.username for author in batch]}
+
+        def post_edit():
+            post_id, author_id = any_post()
+            return author_client(author_id), 'get', reverse(
+                'posts:post_edit', kwargs={'post_id': post_id}), {}
+
+        return {
+            'index': lambda: (guest, 'get', reverse('posts:index'), {
+                'page': self.random.randint(1, 20)}),
+            'group_list': lambda: (guest, 'get', reverse(
+                'posts:group_list',
+                kwargs={'slug': self.random.choice(groups)}), {}),
+            'profile': lambda: (guest, 'get', reverse(
+                'posts:profile',
+                kwargs={'username': authors[any_post()[1]]}), {}),
+            'post_detail': lambda: (guest, 'get', reverse(
+                'posts:post_detail', kwargs={'post_id': any_post()[0]}), {}),
+            'follow_index': lambda: (
+                readers[reader.id], 'get', reverse('posts:follow_index'), {}),
+            'search': lambda: (guest, 'get', reverse('posts:search'), {
+                'q': self.random.choice(words)}),
+            'post_create': lambda: (
+                readers[reader.id], 'get', reverse('posts:post_create'), {}),
+            'post_edit': post_edit,
+            'add_comment': lambda: (readers[reader.id], 'post', reverse(
+                'posts:add_comment', kwargs={'post_id': any_post()[0]}), {
+                'text': 'Комментарий из бенчмарка'}),
+            'profile_follow': follow('profile_follow', following=False),
+            'profile_unfollow': follow('profile_unfollow', following=True),
+            'follow_batch': follow_batch,
+        }
+
+    def login(self, user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def measure(self, options):
+        cases = self.cases()
+        missing = {
+            pattern.name for pattern in urlpatterns
+        } - set(cases)
+        if missing:
+            raise CommandError(
+                f'Нет сценария для URL {app_name}: {", ".join(missing)}')
+        measured = {}
+        for name, case in cases.items():
+            timings, queries, errors = [], [], 0
+            for _ in range(options['requests']):
+                client, method, url, data = case()
+                if options['cache'] == 'cold':
+                    cache.clear()
+                # Полный журнал запросов сломал бы подсчёт по его длине.
+                reset_queries()
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url, data)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(len(captured))
+                errors += response.status_code >= 400
+            measured[f'{app_name}:{name}'] = {
+                'p50_ms': round(percentile(timings, 0.5), 2),
+                'p95_ms': round(percentile(timings, 0.95), 2),
+                'queries_p50': percentile(queries, 0.5),
+                'queries_max': max(queries),
+                'errors': errors,
+            }
+        return measured
+
+    def report(self, size, measured):
+        self.stdout.write(f'\n{size} постов')
+        self.stdout.write(
+            f'{"url name":<24} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"queries":>8} {"errors":>7}')
+        for name, row in measured.items():
+            self.stdout.write(
+                f'{name:<24} {row["p50_ms"]:>8.1f} {row["p95_ms"]:>8.1f} '
+                f'{row["queries_p50"]:>8} {row["errors"]:>7}')
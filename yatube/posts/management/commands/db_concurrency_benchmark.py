@@ -0,0 +1,238 @@
+import glob
+import json
+import logging
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+from argparse import SUPPRESS
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from posts.benchmarks import migrate, percentile, use_database
+from posts.models import Group, Post, User
+
+SAMPLE = 200
+# Запас на запуск процессов-воркеров до общего старта.
+STARTUP = 3
+
+
+class Command(BaseCommand):
+    help = ('Запускает параллельные процессы-читатели и процессы-писатели '
+            '(post_create, add_comment, подписка и отписка) на копии базы '
+            'для каждого профиля DATABASE_PROFILES и каждой раскладки '
+            'таблиц (single — одна база, split — комментарии, подписки '
+            'и сессии в отдельных файлах) и сравнивает пропускную '
+            'способность, задержки и ошибки «database is locked».')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profiles', nargs='+', default=['plain', 'production'],
+            help='профили из settings.DATABASE_PROFILES')
+        parser.add_argument(
+            '--layouts', nargs='+', choices=['single', 'split'],
+            default=['single'], help='раскладки таблиц по базам')
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument(
+            '--duration', type=float, default=10, help='секунд нагрузки')
+        parser.add_argument(
+            '--posts', type=int, default=10000,
+            help='размер базы, если она ещё не засеяна')
+        parser.add_argument(
+            '--data-dir', default=os.path.join(settings.BASE_DIR, 'bench'),
+            help='каталог баз; готовые базы переиспользуются')
+        parser.add_argument('--output', help='файл для результатов в JSON')
+        parser.add_argument('--seed', type=int, default=0)
+        # Служебные параметры процессов-воркеров.
+        parser.add_argument(
+            '--worker', choices=['read', 'write'], help=SUPPRESS)
+        parser.add_argument('--database', help=SUPPRESS)
+        parser.add_argument('--start-at', type=float, help=SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            use_database(options['database'])
+            self.work(options)
+            return
+        unknown = set(options['profiles']) - set(settings.DATABASE_PROFILES)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные профили: {", ".join(sorted(unknown))}')
+        if settings.DATABASE_SPLIT_MODELS:
+            raise CommandError('Запускайте без YATUBE_DB_SPLIT: раскладку '
+                               'таблиц задаёт --layouts')
+        os.makedirs(options['data_dir'], exist_ok=True)
+        source = self.prepare(options)
+        results = {}
+        for profile in options['profiles']:
+            for layout in options['layouts']:
+                results[f'{profile}/{layout}'] = self.measure(
+                    profile, layout, source, options)
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+
+    def prepare(self, options):
+        """Засеянная база, с копий которой начинает каждый профиль."""
+        path = os.path.join(
+            options['data_dir'], f'posts-{options["posts"]}.sqlite3')
+        if not os.path.exists(path):
+            self.stdout.write(f'Засеваю базу на {options["posts"]} постов…')
+            use_database(path)
+            migrate()
+            call_command('seed_data', posts=options['posts'],
+                         seed=options['seed'], stdout=StringIO())
+            connection.close()
+        return path
+
+    def copy(self, source, profile, layout, data_dir):
+        path = os.path.join(
+            data_dir, f'concurrency-{profile}-{layout}.sqlite3')
+        for name in glob.glob(f'{os.path.splitext(path)[0]}*'):
+            os.remove(name)
+        with sqlite3.connect(source) as original, \
+                sqlite3.connect(path) as target:
+            original.backup(target)
+            # Режим журнала хранится в файле: копия начинает с того, что
+            # выставил бы сам профиль.
+            pragmas = settings.DATABASE_PROFILES[profile].get(
+                'OPTIONS', {}).get('pragmas', {})
+            journal_mode = pragmas.get('journal_mode', 'delete')
+            target.execute(f'PRAGMA journal_mode = {journal_mode}')
+        if layout == 'split':
+            subprocess.run(
+                [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'),
+                 'split_databases', '--database', path],
+                env=self.environment(profile, layout),
+                stdout=subprocess.DEVNULL, check=True)
+        return path
+
+    def environment(self, profile, layout):
+        return {**os.environ, 'YATUBE_DB_PROFILE': profile,
+                'YATUBE_DB_SPLIT': '1' if layout == 'split' else ''}
+
+    def measure(self, profile, layout, source, options):
+        path = self.copy(source, profile, layout, options['data_dir'])
+        start_at = time.time() + STARTUP
+        workers = [
+            subprocess.Popen(
+                [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'),
+                 'db_concurrency_benchmark', '--worker', kind,
+                 '--database', path, '--start-at', str(start_at),
+                 '--duration', str(options['duration']),
+                 '--seed', str(options['seed'] * 1000 + number)],
+                env=self.environment(profile, layout),
+                stdout=subprocess.PIPE,
+            )
+            for number, kind in enumerate(
+                ['read'] * options['readers'] + ['write'] * options['writers'])
+        ]
+        results = {kind: {'timings': [], 'errors': 0, 'locked': 0}
+                   for kind in ('read', 'write')}
+        for worker in workers:
+            output, _ = worker.communicate()
+            if worker.returncode:
+                raise CommandError(f'Воркер завершился с кодом '
+                                   f'{worker.returncode}')
+            result = json.loads(output)
+            total = results[result['kind']]
+            total['timings'].extend(result['timings'])
+            total['errors'] += result['errors']
+            total['locked'] += result['locked']
+        return {
+            kind: {
+                'requests': len(total['timings']),
+                'per_second': round(
+                    len(total['timings']) / options['duration'], 1),
+                'p50_ms': round(percentile(total['timings'] or [0], 0.5), 2),
+                'p95_ms': round(percentile(total['timings'] or [0], 0.95), 2),
+                'errors': total['errors'],
+                'locked': total['locked'],
+            }
+            for kind, total in results.items()
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"profile":<18} {"kind":<6} {"req/s":>8} {"p50 ms":>8} '
+            f'{"p95 ms":>8} {"errors":>7} {"locked":>7}')
+        for profile, kinds in results.items():
+            for kind, row in kinds.items():
+                self.stdout.write(
+                    f'{profile:<18} {kind:<6} {row["per_second"]:>8.1f} '
+                    f'{row["p50_ms"]:>8.1f} {row["p95_ms"]:>8.1f} '
+                    f'{row["errors"]:>7} {row["locked"]:>7}')
+
+    def work(self, options):
+        """Тело процесса-воркера: запросы до конца замера, итог — в JSON."""
+        chooser = random.Random(options['seed'])
+        posts = list(Post.objects.order_by('?').values_list(
+            'id', 'author__username')[:SAMPLE])
+        groups = list(Group.objects.values_list('slug', flat=True))
+        client = Client()
+        writer = None
+        if options['worker'] == 'write':
+            writer = chooser.choice(
+                User.objects.filter(posts__isnull=False).distinct()[:SAMPLE])
+            client.force_login(writer)
+        authors = sorted({username for _, username in posts} - {
+            writer and writer.username})
+        followed = set()
+
+        def toggle_follow():
+            # Подписка, при следующем выборе того же автора — отписка.
+            username = chooser.choice(authors)
+            name = ('posts:profile_unfollow' if username in followed
+                    else 'posts:profile_follow')
+            followed.symmetric_difference_update({username})
+            return client.get(reverse(name, args=[username]))
+
+        requests = {
+            'read': lambda: chooser.choice([
+                lambda: client.get(reverse('posts:index'), {
+                    'page': chooser.randint(1, 10)}),
+                lambda: client.get(reverse(
+                    'posts:group_list', args=[chooser.choice(groups)])),
+                lambda: client.get(reverse(
+                    'posts:profile', args=[chooser.choice(posts)[1]])),
+                lambda: client.get(reverse(
+                    'posts:post_detail', args=[chooser.choice(posts)[0]])),
+            ])(),
+            'write': lambda: chooser.choice([
+                lambda: client.post(reverse('posts:post_create'), {
+                    'text': 'Пост из замера конкурентной записи'}),
+                lambda: client.post(reverse(
+                    'posts:add_comment', args=[chooser.choice(posts)[0]]), {
+                    'text': 'Комментарий из замера конкурентной записи'}),
+                toggle_follow,
+            ])(),
+        }[options['worker']]
+        timings, errors, locked = [], 0, 0
+        # Ошибки считаются в итоге, а не печатаются трейсбеком на каждую.
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        time.sleep(max(0, options['start_at'] - time.time()))
+        deadline = options['start_at'] + options['duration']
+        while time.time() < deadline:
+            started = time.perf_counter()
+            try:
+                errors += requests().status_code >= 400
+            except Exception as exc:
+                errors += 1
+                locked += 'database is locked' in str(exc)
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(json.dumps({
+            'kind': options['worker'],
+            'timings': timings,
+            'errors': errors,
+            'locked': locked,
+        }))
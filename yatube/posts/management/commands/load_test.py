@@ -0,0 +1,242 @@
+import bisect
+import io
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from posts.benchmarks import percentile, use_database
+from posts.models import Group, Post, User
+from yatube.wsgi import application
+
+DEFAULT_MIX = ('index=30,group=15,profile=15,detail=20,follow=10,'
+               'create=3,comment=7')
+# Сценарии, которым нужен вошедший пользователь.
+LOGGED_IN_ONLY = {'follow', 'create', 'comment'}
+# Верхние границы корзин гистограммы, мс.
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+SAMPLE = 200
+
+
+class Session:
+    """Cookie вошедшего пользователя: сессия и CSRF-токен."""
+
+    def __init__(self, user):
+        store = SessionStore()
+        store[SESSION_KEY] = str(user.pk)
+        store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        store.save()
+        self.csrf_token = get_random_string(32)
+        self.cookie = (f'{settings.SESSION_COOKIE_NAME}={store.session_key}; '
+                       f'{settings.CSRF_COOKIE_NAME}={self.csrf_token}')
+
+
+class Command(BaseCommand):
+    help = ('Нагружает yatube.wsgi.application прямо в процессе из пула '
+            'потоков смесью анонимных и авторизованных запросов и выводит '
+            'пропускную способность, гистограмму задержек и долю ошибок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument(
+            '--duration', type=float, default=10, help='секунд нагрузки')
+        parser.add_argument(
+            '--mix', default=DEFAULT_MIX,
+            help='веса сценариев: index, group, profile, detail, follow, '
+                 'create, comment')
+        parser.add_argument(
+            '--logged-in', type=float, default=0.3,
+            help='доля авторизованных запросов в анонимных сценариях')
+        parser.add_argument(
+            '--users', type=int, default=50, help='число сессий')
+        parser.add_argument(
+            '--database', help='файл SQLite вместо базы из настроек')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['database']:
+            use_database(options['database'])
+        self.options = options
+        self.mix = self.parse_mix(options['mix'])
+        self.prepare_data()
+        self.lock = threading.Lock()
+        self.results = defaultdict(list)
+        self.statuses = Counter()
+        # Трейсбеки ответов 500 (например, «database is locked») считаются
+        # в статистике, а не печатаются на каждый запрос.
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        deadline = time.monotonic() + options['duration']
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(options['threads']) as pool:
+                workers = [
+                    pool.submit(self.worker, number, deadline)
+                    for number in range(options['threads'])
+                ]
+                for worker in workers:
+                    worker.result()
+        finally:
+            request_logger.setLevel(level)
+        self.report(time.perf_counter() - started)
+
+    def parse_mix(self, mix):
+        try:
+            weights = {
+                name: float(weight) for name, weight in (
+                    item.split('=') for item in mix.split(','))
+            }
+        except ValueError:
+            raise CommandError(f'Некорректная смесь: {mix}')
+        unknown = set(weights) - set(self.scenarios())
+        if unknown:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown))}')
+        return weights
+
+    def prepare_data(self):
+        self.posts = list(Post.objects.order_by('?').values_list(
+            'id', 'author__username')[:SAMPLE])
+        self.groups = list(Group.objects.values_list('slug', flat=True))
+        if not self.posts or not self.groups:
+            raise CommandError(
+                'В базе нет постов или групп: заполните её seed_data')
+        # Активные читатели: у них есть что показать в ленте подписок.
+        users = User.objects.order_by(
+            '-stats__following_count')[:self.options['users']]
+        self.sessions = [Session(user) for user in users]
+        connection.close()
+
+    def scenarios(self):
+        return {
+            'index': self.index,
+            'group': self.group,
+            'profile': self.profile,
+            'detail': self.detail,
+            'follow': self.follow,
+            'create': self.create,
+            'comment': self.comment,
+        }
+
+    def index(self, chooser):
+        return 'GET', reverse('posts:index'), {
+            'page': chooser.randint(1, 10)}
+
+    def group(self, chooser):
+        return 'GET', reverse(
+            'posts:group_list', args=[chooser.choice(self.groups)]), {}
+
+    def profile(self, chooser):
+        _, username = chooser.choice(self.posts)
+        return 'GET', reverse('posts:profile', args=[username]), {}
+
+    def detail(self, chooser):
+        post_id, _ = chooser.choice(self.posts)
+        return 'GET', reverse('posts:post_detail', args=[post_id]), {}
+
+    def follow(self, chooser):
+        return 'GET', reverse('posts:follow_index'), {}
+
+    def create(self, chooser):
+        return 'POST', reverse('posts:post_create'), {
+            'text': f'Пост из нагрузочного теста {chooser.random()}'}
+
+    def comment(self, chooser):
+        post_id, _ = chooser.choice(self.posts)
+        return 'POST', reverse('posts:add_comment', args=[post_id]), {
+            'text': 'Комментарий из нагрузочного теста'}
+
+    def environ(self, method, path, data, session):
+        body = urlencode(data).encode() if method == 'POST' else b''
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': urlencode(data) if method == 'GET' else '',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': io.StringIO(),
+            'CONTENT_LENGTH': str(len(body)),
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        }
+        if session is not None:
+            environ['HTTP_COOKIE'] = session.cookie
+            environ['HTTP_X_CSRFTOKEN'] = session.csrf_token
+        return environ
+
+    def worker(self, number, deadline):
+        chooser = random.Random(self.options['seed'] * 1000 + number)
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        scenarios = self.scenarios()
+        while time.monotonic() < deadline:
+            name = chooser.choices(names, weights)[0]
+            method, path, data = scenarios[name](chooser)
+            session = None
+            if name in LOGGED_IN_ONLY or (
+                    chooser.random() < self.options['logged_in']):
+                session = chooser.choice(self.sessions)
+            status = []
+            started = time.perf_counter()
+            response = application(
+                self.environ(method, path, data, session),
+                lambda line, headers, exc_info=None: status.append(line))
+            try:
+                for _ in response:
+                    pass
+            finally:
+                response.close()
+            elapsed = (time.perf_counter() - started) * 1000
+            with self.lock:
+                self.results[name].append(elapsed)
+                self.statuses[(name, int(status[0].split()[0]))] += 1
+        connection.close()
+
+    def report(self, elapsed):
+        timings = [value for values in self.results.values()
+                   for value in values]
+        if not timings:
+            raise CommandError('Не выполнено ни одного запроса')
+        errors = sum(count for (_, code), count in self.statuses.items()
+                     if code >= 500)
+        self.stdout.write(
+            f'Запросов: {len(timings)} за {elapsed:.1f} с, '
+            f'{len(timings) / elapsed:.1f} запросов/с, '
+            f'ошибок 5xx: {errors} ({errors / len(timings):.2%})')
+        self.stdout.write(
+            f'\n{"scenario":<10} {"count":>7} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"p99 ms":>8}  statuses')
+        for name, values in sorted(self.results.items()):
+            codes = ', '.join(
+                f'{code}: {count}' for (scenario, code), count in sorted(
+                    self.statuses.items()) if scenario == name)
+            self.stdout.write(
+                f'{name:<10} {len(values):>7} '
+                f'{percentile(values, 0.5):>8.1f} '
+                f'{percentile(values, 0.95):>8.1f} '
+                f'{percentile(values, 0.99):>8.1f}  {codes}')
+        self.stdout.write('\nГистограмма задержек, мс')
+        histogram = Counter(
+            bisect.bisect_left(BUCKETS, value) for value in timings)
+        labels = [f'≤{bound}' for bound in BUCKETS] + [f'>{BUCKETS[-1]}']
+        widest = max(histogram.values())
+        for index, label in enumerate(labels):
+            count = histogram.get(index, 0)
+            self.stdout.write(
+                f'{label:>7} {count:>7} {"#" * round(40 * count / widest)}')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import feeds
+from posts.models import Follow
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'user_ids', nargs='*', type=int,
+            help='id пользователей; по умолчанию все, у кого есть подписки'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids'] or (
+            Follow.objects.values_list('user_id', flat=True).distinct())
+        rebuilt = 0
+        for user_id in user_ids:
+            feeds.rebuild(user_id)
+            rebuilt += 1
+        self.stdout.write(f'Пересобрано лент: {rebuilt}')
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import recommendations
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рекомендации «кого читать» по графу подписок '
+            '(друзья друзей с весом по активности авторов).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='пользователей в одной транзакции записи')
+        parser.add_argument(
+            '--top', type=int, help='рекомендаций на пользователя')
+        parser.add_argument(
+            '--fanout', type=int,
+            help='сколько подписок смотреть на каждом шаге графа')
+        parser.add_argument(
+            '--days', type=int, help='окно активности авторов, дней')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(done, total, stored):
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f'{done}/{total} пользователей, {stored} рекомендаций')
+
+        stored = recommendations.rebuild(
+            batch_size=options['batch_size'], top=options['top'],
+            fanout=options['fanout'], days=options['days'],
+            progress=progress)
+        self.stdout.write(
+            f'Сохранено рекомендаций: {stored} '
+            f'за {time.perf_counter() - started:.1f} с')
@@ -0,0 +1,192 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate, islice
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+
+from posts import counters, search
+from posts.models import Comment, Follow, Group, Post, User
+
+# Популярность авторов и постов — по Ципфу: немногие собирают почти всех
+# подписчиков и комментарии, у остальных длинный хвост.
+ZIPF_S = 1.1
+SENTENCES = 2000
+HISTORY = timedelta(days=365)
+
+
+@contextmanager
+def explicit_dates():
+    """Отключает auto_now/auto_now_add, чтобы задать даты самим."""
+    fields = [
+        Post._meta.get_field('pub_date'),
+        Post._meta.get_field('modified'),
+        Comment._meta.get_field('created'),
+    ]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def zipf_weights(count):
+    return list(accumulate(1 / rank ** ZIPF_S for rank in range(1, count + 1)))
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, комментариями и подписками пакетными вставками.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument(
+            '--users', type=int,
+            help='по умолчанию один пользователь на 50 постов')
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument(
+            '--follows', type=float, default=20,
+            help='среднее число подписок пользователя')
+        parser.add_argument(
+            '--comments', type=float, default=3,
+            help='среднее число комментариев на пост')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.sentences = [
+            self.fake.sentence(nb_words=12) for _ in range(SENTENCES)]
+        self.now = timezone.now()
+        users = options['users'] or max(options['posts'] // 50, 10)
+        with explicit_dates(), transaction.atomic():
+            user_ids = self.create_users(users)
+            group_ids = self.create_groups(options['groups'])
+            posts = self.create_posts(options['posts'], user_ids, group_ids)
+            self.create_comments(posts, user_ids)
+            self.create_follows(user_ids)
+            # bulk_create не вызывает сигналы: производные данные — целиком.
+            counters.recount()
+            call_command('rebuild_feeds', stdout=StringIO())
+            if search.available():
+                search.rebuild()
+        cache.clear()
+        self.stdout.write(
+            f'Создано: пользователей {len(user_ids)}, групп '
+            f'{len(group_ids)}, постов {len(posts)}, комментариев '
+            f'{self.comments_created}, подписок {self.follows_created}')
+
+    def bulk_create(self, model, objects):
+        # Пачками, чтобы не держать в памяти все объекты; размер одного
+        # INSERT Django сам подгоняет под лимиты SQLite.
+        objects = iter(objects)
+        while True:
+            batch = list(islice(objects, self.options['batch_size']))
+            if not batch:
+                return
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def new_ids(self, model, create):
+        # SQLite не возвращает id из bulk_create, берём новые по порядку.
+        last_id = model.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        create()
+        return model.objects.filter(id__gt=last_id).order_by('id')
+
+    def text(self, sentences):
+        return ' '.join(self.random.choices(self.sentences, k=sentences))
+
+    def create_users(self, count):
+        prefix = f'seed{self.options["seed"]}_'
+        taken = User.objects.filter(username__startswith=prefix).count()
+        return list(self.new_ids(User, lambda: self.bulk_create(User, (
+            User(
+                username=f'{prefix}{number}',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                password='!',
+            )
+            for number in range(taken, taken + count)
+        ))).values_list('id', flat=True))
+
+    def create_groups(self, count):
+        prefix = f'seed{self.options["seed"]}-'
+        taken = Group.objects.filter(slug__startswith=prefix).count()
+        return list(self.new_ids(Group, lambda: self.bulk_create(Group, (
+            Group(
+                title=self.fake.word().capitalize(),
+                slug=f'{prefix}{number}',
+                description=self.text(2),
+            )
+            for number in range(taken, taken + count)
+        ))).values_list('id', flat=True))
+
+    def create_posts(self, count, user_ids, group_ids):
+        authors = user_ids[:]
+        self.random.shuffle(authors)
+        weights = zipf_weights(len(authors))
+        step = HISTORY / count
+
+        def posts():
+            for number in range(count):
+                pub_date = self.now - HISTORY + step * number
+                yield Post(
+                    text=self.text(self.random.randint(1, 6)),
+                    pub_date=pub_date,
+                    modified=pub_date,
+                    author_id=self.random.choices(
+                        authors, cum_weights=weights)[0],
+                    group_id=(self.random.choice(group_ids)
+                              if self.random.random() < 0.7 else None),
+                )
+        return list(self.new_ids(
+            Post, lambda: self.bulk_create(Post, posts())
+        ).values_list('id', 'pub_date'))
+
+    def create_comments(self, posts, user_ids):
+        count = int(len(posts) * self.options['comments'])
+        hot = posts[:]
+        self.random.shuffle(hot)
+        weights = zipf_weights(len(hot))
+
+        def comments():
+            for post_id, pub_date in self.random.choices(
+                    hot, cum_weights=weights, k=count):
+                yield Comment(
+                    post_id=post_id,
+                    author_id=self.random.choice(user_ids),
+                    text=self.text(1),
+                    created=min(pub_date + timedelta(
+                        minutes=self.random.expovariate(1 / 600)), self.now),
+                )
+        self.bulk_create(Comment, comments())
+        self.comments_created = count
+
+    def create_follows(self, user_ids):
+        authors = user_ids[:]
+        self.random.shuffle(authors)
+        weights = zipf_weights(len(authors))
+        follows = []
+        for user_id in user_ids:
+            wanted = min(int(self.random.expovariate(
+                1 / self.options['follows'])), len(authors) - 1)
+            chosen = set(self.random.choices(
+                authors, cum_weights=weights, k=wanted))
+            chosen.discard(user_id)
+            follows.extend(
+                Follow(user_id=user_id, author_id=author_id)
+                for author_id in chosen)
+        self.bulk_create(Follow, follows)
+        self.follows_created = len(follows)
@@ -0,0 +1,53 @@
+from itertools import islice
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from posts.benchmarks import use_database
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ('Создаёт базы из DATABASE_SPLIT_MODELS и переносит в них строки '
+            'их моделей из основной базы. Запускать при остановленном '
+            'сайте: после переноса таблицы в основной базе пусты, по ним '
+            'только ищет зависимые строки каскадное удаление.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            help='файл основной базы SQLite; отдельные базы — рядом с ним')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_SPLIT_MODELS:
+            raise CommandError('Разделение баз не включено: задайте '
+                               'YATUBE_DB_SPLIT')
+        if options['database']:
+            use_database(options['database'])
+        for label, alias in settings.DATABASE_SPLIT_MODELS.items():
+            call_command('migrate', database=alias, verbosity=0)
+            moved = self.move(apps.get_model(label), alias)
+            self.stdout.write(f'{label} → {alias}: {moved}')
+
+    def move(self, model, alias):
+        rows = model._base_manager.using(DEFAULT_DB_ALIAS).order_by(
+            'pk').iterator(chunk_size=BATCH_SIZE)
+        moved = 0
+        with transaction.atomic(using=alias):
+            while True:
+                batch = list(islice(rows, BATCH_SIZE))
+                if not batch:
+                    break
+                model._base_manager.using(alias).bulk_create(
+                    batch, ignore_conflicts=True)
+                moved += len(batch)
+        # Без delete(): сигналы удаления поменяли бы счётчики и ленты.
+        primary = connections[DEFAULT_DB_ALIAS]
+        with primary.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {primary.ops.quote_name(model._meta.db_table)}')
+        return moved
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import time
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from posts.forms import PostForm
+
+BOUNDARY = 'UploadBenchmarkBoundary'
+
+
+def in_child(func, *args):
+    """Выполняет func в форке; возвращает код выхода и пик RSS в МБ.
+
+    Пик памяти у каждого форка свой, поэтому загрузки не влияют друг на
+    друга, а родитель не держит в памяти ни картинки, ни тело запроса.
+    """
+    pid = os.fork()
+    if pid == 0:
+        code = 2
+        try:
+            code = func(*args)
+        finally:
+            os._exit(code)
+    _, status, usage = os.wait4(pid, 0)
+    # ru_maxrss в Linux считается в килобайтах.
+    code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+    return code, usage.ru_maxrss / 1024
+
+
+def write_request_body(path, kind, megapixels):
+    """Пишет multipart-тело формы создания поста с картинкой в файл."""
+    side = int((megapixels * 10 ** 6) ** 0.5)
+    if kind == 'bomb':
+        # Почти пустой PNG огромного разрешения: сотни байт на диске.
+        image, image_format = Image.new('1', (side, side)), 'PNG'
+    else:
+        # Шум, растянутый с малого размера, сжимается как фотография.
+        image = Image.effect_noise((side // 8, side // 8), 64).convert('RGB')
+        image = image.resize((side, side), Image.BICUBIC)
+        image_format = 'JPEG'
+    with open(path, 'wb') as body:
+        body.write((
+            f'--{BOUNDARY}\r\n'
+            'Content-Disposition: form-data; name="text"\r\n\r\n'
+            'Тестовый пост\r\n'
+            f'--{BOUNDARY}\r\n'
+            'Content-Disposition: form-data; name="image"; '
+            f'filename="image.{image_format.lower()}"\r\n'
+            f'Content-Type: image/{image_format.lower()}\r\n\r\n'
+        ).encode())
+        image.save(body, format=image_format, quality=90)
+        body.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+    return 0
+
+
+def upload(path, results):
+    """Разбирает тело как WSGI-запрос и валидирует PostForm."""
+    started = time.perf_counter()
+    with open(path, 'rb') as body:
+        request = WSGIRequest({
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': '/create/',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': body,
+            'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+            'CONTENT_LENGTH': str(os.path.getsize(path)),
+        })
+        form = PostForm(request.POST, request.FILES)
+        valid = form.is_valid()
+    elapsed = time.perf_counter() - started
+    verdict = 'ok' if valid else '; '.join(
+        error.code for error in form.errors.as_data().get('image', []))
+    with open(results, 'w') as output:
+        output.write(f'{elapsed}\t{verdict}')
+    return 0
+
+
+def idle():
+    return 0
+
+
+class Command(BaseCommand):
+    help = ('Измеряет пиковую память (RSS) и время разбора загрузки '
+            'картинки в PostForm для картинок разного размера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--megapixels', type=float, nargs='+', default=[2, 12, 36, 64],
+            help='разрешения фотографий в мегапикселях')
+        parser.add_argument(
+            '--bomb', type=float, default=400,
+            help='разрешение почти пустого PNG в мегапикселях, 0 — без него')
+
+    def handle(self, *args, **options):
+        cases = [('photo', mp) for mp in options['megapixels']]
+        if options['bomb']:
+            cases.append(('bomb', options['bomb']))
+        _, baseline = in_child(idle)
+        self.stdout.write(f'Базовый RSS процесса: {baseline:.1f} МБ')
+        self.stdout.write(
+            f'{"image":<14} {"body MB":>8} {"peak RSS MB":>12} '
+            f'{"ms":>8}  result')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'body')
+            results = os.path.join(directory, 'results')
+            for kind, megapixels in cases:
+                in_child(write_request_body, path, kind, megapixels)
+                code, peak = in_child(upload, path, results)
+                if code:
+                    verdict, elapsed = 'crashed', 0.0
+                else:
+                    with open(results) as output:
+                        elapsed, verdict = output.read().split('\t')
+                self.stdout.write(
+                    f'{f"{kind} {megapixels:g}MP":<14} '
+                    f'{os.path.getsize(path) / 2 ** 20:>8.1f} '
+                    f'{peak - baseline:>12.1f} '
+                    f'{float(elapsed) * 1000:>8.0f}  {verdict}')
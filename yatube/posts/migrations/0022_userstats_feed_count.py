@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:09
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_feed_counts(apps, schema_editor):
+    UserStats = apps.get_model('posts', 'UserStats')
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    for user_id, total in FeedEntry.objects.order_by().values_list('user_id').annotate(Count('id')):
+        UserStats.objects.filter(user_id=user_id).update(feed_count=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_recommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='feed_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Записей в ленте подписок'),
+        ),
+        migrations.RunPython(fill_feed_counts, migrations.RunPython.noop),
+    ]
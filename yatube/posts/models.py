@@ -1,11 +1,17 @@
-from django.db import models
+from django.db import connections, models, router, transaction
 from django.contrib.auth import get_user_model
+from django.dispatch import Signal
 
 
 LIMIT = 15
 
 User = get_user_model()
 
+# Пакетная подписка и отписка (FollowManager) не шлют post_save и
+# post_delete по каждой строке: ленты и счётчики обновляет приёмник этого
+# сигнала в posts.signals сразу для всех авторов.
+follows_changed = Signal(providing_args=['user_id', 'added', 'removed'])
+
 
 class Post(models.Model):
     text = models.TextField(
@@ -15,6 +21,10 @@ class Post(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    modified = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -35,9 +45,29 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True,
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев'
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            # id в конце индекса нужен курсорной пагинации по (pub_date, id).
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'
+            ),
+        ]
         verbose_name_plural = 'Посты'
         verbose_name = 'Пост'
 
@@ -49,6 +79,11 @@ class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name='Заголовок')
     slug = models.SlugField(unique=True)
     description = models.TextField(verbose_name='Описание группы')
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество постов'
+    )
 
     class Meta:
         verbose_name = 'Группа'
@@ -59,15 +94,20 @@ class Group(models.Model):
 
 
 class Comment(models.Model):
+    # Комментарии и подписки могут жить в отдельных базах
+    # (DATABASE_SPLIT_MODELS), поэтому без ограничений внешнего ключа
+    # в SQLite; каскадное удаление там делают сигналы в posts.signals.
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
+        db_constraint=False,
         related_name='comments',
         verbose_name='Пост'
     )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_constraint=False,
         related_name='comments',
         verbose_name='Автор'
     )
@@ -78,6 +118,12 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            models.Index(
+                fields=('post', '-created', '-id'),
+                name='comment_post_created_idx'
+            ),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -85,20 +131,84 @@ class Comment(models.Model):
         return self.text[:LIMIT]
 
 
+class FollowManager(models.Manager):
+    def follow(self, user, author_ids):
+        """Подписывает user на авторов author_ids в одной транзакции.
+
+        Строки вставляются одним INSERT; уже существующие подписки
+        пропускает ограничение unique_user_author. Возвращает множество id
+        авторов, подписка на которых появилась.
+        """
+        author_ids = set(author_ids) - {user.id}
+        using = router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            added = author_ids - set(self.using(using).filter(
+                user=user, author_id__in=author_ids
+            ).values_list('author_id', flat=True))
+            self.using(using).bulk_create(
+                [self.model(user=user, author_id=author_id)
+                 for author_id in sorted(added)],
+                ignore_conflicts=True
+            )
+            if added:
+                follows_changed.send(
+                    sender=self.model, user_id=user.id, added=added,
+                    removed=set())
+        return added
+
+    def unfollow(self, user, author_ids):
+        """Отписывает user от авторов author_ids одним DELETE.
+
+        Возвращает множество id авторов, подписка на которых была.
+        """
+        using = router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            rows = self.using(using).filter(
+                user=user, author_id__in=set(author_ids))
+            removed = set(rows.values_list('author_id', flat=True))
+            if removed:
+                # Явный DELETE без выборки объектов: rows.delete() вызвал бы
+                # follow_deleted на каждую подписку и повторил бы работу
+                # follows_changed.
+                self._delete(using, user.id, removed)
+                follows_changed.send(
+                    sender=self.model, user_id=user.id, added=set(),
+                    removed=removed)
+        return removed
+
+    def _delete(self, using, user_id, author_ids):
+        connection = connections[using]
+        quote = connection.ops.quote_name
+        meta = self.model._meta
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM {} WHERE {} = %s AND {} IN ({})'.format(
+                    quote(meta.db_table),
+                    quote(meta.get_field('user').column),
+                    quote(meta.get_field('author').column),
+                    ', '.join(['%s'] * len(author_ids))),
+                [user_id, *author_ids])
+
+
 class Follow(models.Model):
+    # Без внешних ключей в SQLite — как у Comment.
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_constraint=False,
         related_name='follower',
         verbose_name='Пользователь',
     )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_constraint=False,
         related_name='following',
         verbose_name='Автор'
     )
 
+    objects = FollowManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -106,8 +216,115 @@ class Follow(models.Model):
                 name='unique_user_author'
             )
         ]
+        indexes = [
+            # Подписчики автора для раскладки постов по лентам.
+            models.Index(
+                fields=('author', 'user'),
+                name='follow_author_user_idx'
+            ),
+        ]
         verbose_name_plural = 'Подписки'
         verbose_name = 'Подписка'
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name='Количество постов')
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Количество подписчиков')
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name='Количество подписок')
+    feed_count = models.PositiveIntegerField(
+        default=0, verbose_name='Записей в ленте подписок')
+
+    class Meta:
+        verbose_name_plural = 'Счётчики пользователей'
+        verbose_name = 'Счётчики пользователя'
+
+    def __str__(self):
+        return f'Счётчики {self.user}'
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Пользователь',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_feed_user_post'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date'),
+                name='feed_user_pub_date_idx'
+            )
+        ]
+        verbose_name_plural = 'Записи лент'
+        verbose_name = 'Запись ленты'
+
+    def __str__(self):
+        return f'{self.post} в ленте {self.user}'
+
+
+class Recommendation(models.Model):
+    """Кого читать: рассчитывается командой recommend_follows."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+        verbose_name='Пользователь',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    score = models.FloatField(verbose_name='Вес')
+
+    class Meta:
+        ordering = ('-score',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_recommendation_user_author'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-score'),
+                name='recommendation_user_score_idx'
+            )
+        ]
+        verbose_name_plural = 'Рекомендации'
+        verbose_name = 'Рекомендация'
+
+    def __str__(self):
+        return f'{self.author} для {self.user}'
@@ -0,0 +1,163 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Q
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации: без номера и без подсчёта строк."""
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor,
+                 cursor_key=''):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        # Разобранный курсор: одинаков для любых записей одного курсора
+        # и пуст для первой страницы и некорректного курсора.
+        self.cursor_key = cursor_key
+
+    def __repr__(self):
+        return '<CursorPage>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по полям ordering (по умолчанию -pub_date, -id).
+
+    Страница выбирается условием WHERE по значениям ключа из курсора,
+    поэтому глубокие страницы стоят столько же, сколько первая,
+    а COUNT(*) выполняется только при явном обращении к count.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        self.ordering = tuple(ordering)
+        super().__init__(object_list.order_by(*self.ordering), per_page)
+
+    def encode_cursor(self, obj, direction):
+        values = [
+            self._field(name).value_to_string(obj)
+            for name in self._names()
+        ]
+        return base64.urlsafe_b64encode(
+            json.dumps([direction, values]).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            direction, values = json.loads(
+                base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            names = self._names()
+            if (direction not in (NEXT, PREVIOUS)
+                    or not isinstance(values, list)
+                    or len(values) != len(names)):
+                raise ValueError(cursor)
+            values = [
+                self._field(name).to_python(value)
+                for name, value in zip(names, values)
+            ]
+            # Поля ключа NOT NULL: None не даст ни условия, ни страницы.
+            if None in values:
+                raise ValueError(cursor)
+            return direction, values
+        except (ValueError, TypeError, ValidationError,
+                binascii.Error) as error:
+            raise InvalidPage('Некорректный курсор') from error
+
+    def page(self, cursor=None):
+        if not cursor:
+            rows = self._fetch(self.object_list)
+            return self._build(rows[:self.per_page], self._more(rows), False)
+        direction, values = self.decode_cursor(cursor)
+        key = '{}:{}'.format(direction, '|'.join(map(str, values)))
+        if direction == NEXT:
+            rows = self._fetch(self.object_list.filter(self._after(values)))
+            return self._build(
+                rows[:self.per_page], self._more(rows), True, key)
+        rows = self._fetch(self.object_list.filter(
+            self._before(values)).order_by(*self._reversed()))
+        return self._build(
+            rows[:self.per_page][::-1], True, self._more(rows), key)
+
+    def get_page(self, cursor=None):
+        try:
+            return self.page(cursor)
+        except InvalidPage:
+            return self.page()
+
+    def _fetch(self, queryset):
+        # Лишняя строка показывает, есть ли что-то за границей страницы.
+        return list(queryset[:self.per_page + 1])
+
+    def _more(self, rows):
+        return len(rows) > self.per_page
+
+    def _build(self, rows, has_next, has_previous, key=''):
+        return CursorPage(
+            rows, self,
+            self.encode_cursor(rows[-1], NEXT) if rows and has_next else None,
+            self.encode_cursor(rows[0], PREVIOUS)
+            if rows and has_previous else None,
+            key,
+        )
+
+    def _names(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def _field(self, name):
+        return self.object_list.model._meta.get_field(name)
+
+    def _reversed(self):
+        return [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        ]
+
+    def _keyset(self, values, ordering):
+        """Условие «строго дальше по ordering» для кортежа values.
+
+        Нестрогая граница по первому полю вынесена отдельно: по ней SQLite
+        идёт диапазоном по индексу в нужном порядке, без сортировки.
+        """
+        condition = Q()
+        for position, name in enumerate(ordering):
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            equal = {
+                previous.lstrip('-'): value
+                for previous, value in zip(ordering[:position], values)
+            }
+            condition |= Q(
+                **equal, **{f'{name.lstrip("-")}__{lookup}': values[position]})
+        first = ordering[0]
+        bound = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{bound}': values[0]}) & condition
+
+    def _after(self, values):
+        return self._keyset(values, self.ordering)
+
+    def _before(self, values):
+        return self._keyset(values, self._reversed())
+
+
+def get_page(request, object_list, count=None):
+    """Страница ленты: курсорная при ?cursor= или POSTS_PAGINATION = 'cursor',
+    иначе по номеру ?page=."""
+    cursor = request.GET.get('cursor')
+    if cursor is not None or settings.POSTS_PAGINATION == 'cursor':
+        return CursorPaginator(
+            object_list, settings.POSTS_PER_PAGE).get_page(cursor)
+    paginator = Paginator(object_list, settings.POSTS_PER_PAGE)
+    if count is not None:
+        # Денормализованный счётчик вместо COUNT(*) по ленте.
+        paginator.count = count
+    return paginator.get_page(request.GET.get('page'))
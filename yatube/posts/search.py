@@ -0,0 +1,153 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+В виртуальной таблице posts_post_fts лежат основы слов текста поста
+(rowid — id поста); таблица обновляется сигналами сохранения и удаления
+поста и пересобирается командой rebuild_search_index. Запрос тоже
+стеммится, так что «кошки» находит «кошкам». Результаты упорядочены по
+bm25 и листаются курсором по (rank, rowid).
+"""
+import base64
+import binascii
+import json
+import re
+
+from django.db import connection, transaction
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .paginators import CursorPage
+from .stemmer import stem
+
+TABLE = 'posts_post_fts'
+WORD = re.compile(r'\w+')
+SNIPPET_WORDS = 30
+REBUILD_BATCH = 2000
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def stems(text):
+    return [stem(word) for word in WORD.findall(text)]
+
+
+def match_expression(query):
+    """Запрос FTS5: все основы слов запроса, каждая как префикс."""
+    terms = dict.fromkeys(stems(query))
+    return ' AND '.join(f'"{term}"*' for term in terms) or None
+
+
+def index(post):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post.id])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, stems) VALUES (%s, %s)',
+            [post.id, ' '.join(stems(post.text))])
+
+
+def remove(post_id):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild():
+    """Пересобирает индекс по всем постам; возвращает их число."""
+    total = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        rows = Post.objects.order_by().values_list('id', 'text')
+        batch = []
+        for post_id, text in rows.iterator(chunk_size=REBUILD_BATCH):
+            batch.append((post_id, ' '.join(stems(text))))
+            if len(batch) == REBUILD_BATCH:
+                total += _insert(cursor, batch)
+                batch = []
+        total += _insert(cursor, batch)
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return total
+
+
+def _insert(cursor, batch):
+    cursor.executemany(
+        f'INSERT INTO {TABLE} (rowid, stems) VALUES (%s, %s)', batch)
+    return len(batch)
+
+
+def matching_ids_sql(match):
+    """SQL и параметры подзапроса id постов под выражение match."""
+    return f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [match]
+
+
+def search(query, per_page, cursor=None):
+    """Страница найденных постов с подсвеченными фрагментами текста."""
+    match = match_expression(query)
+    if match is None:
+        return CursorPage([], None, None, None)
+    sql = f'SELECT rowid, rank FROM {TABLE} WHERE {TABLE} MATCH %s'
+    params = [match]
+    position = decode_cursor(cursor)
+    if position is not None:
+        sql += ' AND (rank > %s OR (rank = %s AND rowid > %s))'
+        params += [position[0], position[0], position[1]]
+    sql += ' ORDER BY rank, rowid LIMIT %s'
+    params.append(per_page + 1)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [post_id for post_id, _ in rows[:per_page]])
+    terms = set(stems(query))
+    results = []
+    for post_id, _ in rows[:per_page]:
+        # Пост мог быть удалён между запросами к индексу и к таблице.
+        if post_id in posts:
+            post = posts[post_id]
+            post.snippet = snippet(post.text, terms)
+            results.append(post)
+    next_cursor = None
+    if len(rows) > per_page:
+        next_cursor = encode_cursor(rows[per_page - 1])
+    return CursorPage(results, None, next_cursor, None)
+
+
+def encode_cursor(row):
+    return base64.urlsafe_b64encode(
+        json.dumps(list(row)).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        post_id, rank = json.loads(
+            base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return float(rank), int(post_id)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+
+
+def snippet(text, terms, words=SNIPPET_WORDS):
+    """Фрагмент текста вокруг первого совпадения, совпадения в <mark>."""
+    tokens = re.split(r'(\w+)', text)
+    # Нечётные элементы split — слова, чётные — разделители между ними.
+    matched = {
+        position for position in range(1, len(tokens), 2)
+        if any(stem(tokens[position]).startswith(term) for term in terms)
+    }
+    start = max(min(matched, default=1) - words, 0)
+    start -= start % 2
+    end = min(start + words * 2, len(tokens))
+    parts = [
+        f'<mark>{escape(token)}</mark>' if position in matched
+        else escape(token)
+        for position, token in enumerate(tokens[start:end], start)
+    ]
+    prefix = '… ' if start > 0 else ''
+    suffix = ' …' if end < len(tokens) else ''
+    return mark_safe(prefix + ''.join(parts).strip() + suffix)
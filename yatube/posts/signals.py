@@ -0,0 +1,120 @@
+from django.db.models import Q
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save)
+from django.dispatch import receiver
+
+from core.db_routers import split_alias
+
+from . import caching, counters, feeds, following, search, thumbnails
+from .models import (
+    Comment, Follow, Group, Post, User, UserStats, follows_changed)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+    elif update_fields != frozenset({'last_login'}):
+        # Имя автора выводится в карточках его постов во всех лентах.
+        caching.bump(f'card_author:{instance.id}', 'authors')
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    # Запоминаем прежнюю группу, чтобы перенести счётчик при смене.
+    instance._previous_group_id = None
+    if instance.pk is not None:
+        instance._previous_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    caching.bump(*caching.post_scopes(instance))
+    thumbnails.schedule_on_commit(instance)
+    search.index(instance)
+    if created:
+        feeds.fan_out(instance)
+        counters.change(UserStats, instance.author_id, 'posts_count', 1)
+        counters.change(Group, instance.group_id, 'posts_count', 1)
+        counters.change_posts_total(1)
+    elif instance._previous_group_id != instance.group_id:
+        caching.bump(f'group:{instance._previous_group_id}')
+        counters.change(
+            Group, instance._previous_group_id, 'posts_count', -1)
+        counters.change(Group, instance.group_id, 'posts_count', 1)
+
+
+def delete_split(model, condition):
+    # CASCADE удаляет зависимые строки только в базе родителя; в отдельной
+    # базе (DATABASE_SPLIT_MODELS) их удаляем сами.
+    if split_alias(model) is not None:
+        model.objects.filter(condition).delete()
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    delete_split(Comment, Q(author_id=instance.id))
+    delete_split(Follow, Q(user_id=instance.id) | Q(author_id=instance.id))
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    delete_split(Comment, Q(post_id=instance.id))
+    feeds.remove_post(instance.id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    caching.bump(*caching.post_scopes(instance))
+    search.remove(instance.id)
+    counters.change(UserStats, instance.author_id, 'posts_count', -1)
+    counters.change(Group, instance.group_id, 'posts_count', -1)
+    counters.change_posts_total(-1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    caching.bump(f'post:{instance.post_id}')
+    if created:
+        counters.change(Post, instance.post_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    caching.bump(f'post:{instance.post_id}')
+    counters.change(Post, instance.post_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    # Название группы выводится и в общих лентах, и на странице поста.
+    caching.bump(f'group:{instance.id}', f'card_group:{instance.id}',
+                 'groups')
+
+
+@receiver(follows_changed, sender=Follow)
+def subscriptions_changed(sender, user_id, added, removed, **kwargs):
+    if added:
+        feeds.backfill(user_id, added)
+        counters.change_many(UserStats, added, 'followers_count', 1)
+    if removed:
+        feeds.remove_authors(user_id, removed)
+        counters.change_many(UserStats, removed, 'followers_count', -1)
+    counters.change(
+        UserStats, user_id, 'following_count', len(added) - len(removed))
+    following.changed(user_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        subscriptions_changed(
+            sender, instance.user_id, {instance.author_id}, set())
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    subscriptions_changed(
+        sender, instance.user_id, set(), {instance.author_id})
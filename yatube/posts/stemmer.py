@@ -0,0 +1,112 @@
+"""Стеммер русского языка по алгоритму Snowball (Porter для русского).
+
+Токенайзеры FTS5 не умеют стемминг русского, поэтому в индекс и в запрос
+попадают уже обрезанные до основы слова.
+"""
+from functools import lru_cache
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'),
+                     ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+REFLEXIVE = ((), ('ся', 'сь'))
+ADJECTIVE = ((), (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею'))
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'))
+NOUN = ((), (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и',
+    'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о',
+    'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я'))
+SUPERLATIVE = ('ейше', 'ейш')
+
+
+def _longest_first(groups):
+    after_a, plain = groups
+    return sorted(
+        [(ending, True) for ending in after_a]
+        + [(ending, False) for ending in plain],
+        key=lambda item: len(item[0]), reverse=True)
+
+
+PERFECTIVE_GERUND, REFLEXIVE, ADJECTIVE, PARTICIPLE, VERB, NOUN = map(
+    _longest_first,
+    (PERFECTIVE_GERUND, REFLEXIVE, ADJECTIVE, PARTICIPLE, VERB, NOUN))
+DERIVATIONAL = ('ость', 'ост')
+
+
+def _region(word, start):
+    """Начало области после первой пары «гласная, согласная»."""
+    for index in range(start + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            return index + 1
+    return len(word)
+
+
+def _strip(rv, endings):
+    """Снимает самое длинное окончание из endings; None, если его нет.
+
+    Окончания первой группы (after_a) снимаются только после «а» или «я».
+    """
+    for ending, after_a in endings:
+        if rv.endswith(ending):
+            stem = rv[:-len(ending)]
+            if not after_a:
+                return stem
+            return stem if stem.endswith(('а', 'я')) else None
+    return None
+
+
+def _strip_ending(rv):
+    """Шаг 1: деепричастие, иначе возвратность и прилагательное, глагол
+    или существительное."""
+    stripped = _strip(rv, PERFECTIVE_GERUND)
+    if stripped is not None:
+        return stripped
+    rv = _strip(rv, REFLEXIVE) or rv
+    stripped = _strip(rv, ADJECTIVE)
+    if stripped is not None:
+        return _strip(stripped, PARTICIPLE) or stripped
+    for endings in (VERB, NOUN):
+        stripped = _strip(rv, endings)
+        if stripped is not None:
+            return stripped
+    return rv
+
+
+def _tidy_up(rv):
+    """Шаг 4: «нн» в «н», превосходная степень и мягкий знак."""
+    if rv.endswith('нн'):
+        return rv[:-1]
+    for ending in SUPERLATIVE:
+        if rv.endswith(ending):
+            rv = rv[:-len(ending)]
+            break
+    if rv.endswith('нн') or rv.endswith('ь'):
+        return rv[:-1]
+    return rv
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv_start = next(
+        (index + 1 for index, char in enumerate(word) if char in VOWELS),
+        len(word))
+    r2_start = _region(word, _region(word, 0))
+    prefix, rv = word[:rv_start], _strip_ending(word[rv_start:])
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    for ending in DERIVATIONAL:
+        if rv.endswith(ending) and (
+                rv_start + len(rv) - len(ending) >= r2_start):
+            rv = rv[:-len(ending)]
+            break
+    return prefix + _tidy_up(rv)
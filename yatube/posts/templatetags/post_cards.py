@@ -0,0 +1,26 @@
+from django import template
+
+from posts import caching, following, thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """Готовая миниатюра картинки поста или None, пока она готовится."""
+    return thumbnails.thumbnail_ready(post)
+
+
+@register.filter
+def card_version(post):
+    """Версия карточки: время правки поста и версии её scope."""
+    return '{}.{}'.format(
+        post.modified.timestamp(),
+        caching.versions(*caching.card_scopes(post))
+    )
+
+
+@register.filter
+def followed_by(author_id, user):
+    """Подписан ли user на автора: по кэшу подписок, без запроса к базе."""
+    return author_id in following.authors(user)
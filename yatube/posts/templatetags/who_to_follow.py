@@ -0,0 +1,11 @@
+from django import template
+
+from posts import recommendations
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/who_to_follow.html')
+def who_to_follow(user):
+    """Виджет «кого читать»: готовые рекомендации из таблицы."""
+    return {'authors': recommendations.for_user(user)}
@@ -0,0 +1,146 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+
+from core.cache import get_or_compute
+from core.cache_backends import RedisCache, SQLiteCache
+from posts import caching
+
+
+class FakeRedis:
+    """Локальная замена redis.Redis с нужным RedisCache подмножеством."""
+    servers = {}
+
+    def __init__(self, data):
+        self.data = data
+
+    @classmethod
+    def from_url(cls, url):
+        return cls(cls.servers.setdefault(url, {}))
+
+    def _alive(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires < time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def get(self, key):
+        return self._alive(key)
+
+    def mget(self, keys):
+        return [self._alive(key) for key in keys]
+
+    def set(self, key, value, px=None, nx=False):
+        if nx and self._alive(key) is not None:
+            return None
+        expires = None if px is None else time.monotonic() + px / 1000
+        self.data[key] = (value, expires)
+        return True
+
+    def exists(self, key):
+        return int(self._alive(key) is not None)
+
+    def incrby(self, key, delta):
+        value = int(self._alive(key) or 0) + delta
+        self.data[key] = (str(value).encode(), self.data[key][1])
+        return value
+
+    def pexpire(self, key, px):
+        return self.set(key, self._alive(key), px) if self.exists(key) else 0
+
+    def persist(self, key):
+        return self.set(key, self._alive(key)) if self.exists(key) else 0
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def flushdb(self):
+        self.data.clear()
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_versions_change_on_bump(self):
+        """bump() меняет строку версий только для своих scope."""
+        index = caching.versions('index')
+        group = caching.versions('group:1')
+        caching.bump('index')
+        self.assertNotEqual(caching.versions('index'), index)
+        self.assertEqual(caching.versions('group:1'), group)
+
+    def test_single_flight_waits_for_lock_holder(self):
+        """Пока блокировку держит другой процесс, значение не
+        пересчитывается, а берётся готовым из кэша."""
+        cache.add('fragment:lock', 1)
+        timer = threading.Timer(0.1, cache.set, ('fragment', 'ready'))
+        timer.start()
+        calls = []
+        value = get_or_compute(
+            'fragment', lambda: calls.append(1) or 'computed', 60)
+        timer.join()
+        self.assertEqual(value, 'ready')
+        self.assertEqual(calls, [])
+
+
+class SharedCacheBackendsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        location = os.path.join(self.directory, 'cache.sqlite3')
+        redis_params = {
+            'OPTIONS': {'CLIENT_CLASS': 'posts.tests.test_cache.FakeRedis'}}
+        # Два экземпляра с общим хранилищем изображают два воркера.
+        self.pairs = (
+            (SQLiteCache(location, {}), SQLiteCache(location, {})),
+            (RedisCache('redis://test', redis_params),
+             RedisCache('redis://test', redis_params)),
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_shared_backends_are_visible_across_workers(self):
+        """Запись, add, incr и delete одного воркера видны другому."""
+        for first, second in self.pairs:
+            with self.subTest(backend=type(first).__name__):
+                first.clear()
+                first.set('page', {'html': '<p>'})
+                self.assertEqual(second.get('page'), {'html': '<p>'})
+                self.assertTrue(first.add('lock', 1, 10))
+                self.assertFalse(second.add('lock', 1, 10))
+                first.set('version', 5, None)
+                self.assertEqual(second.incr('version'), 6)
+                self.assertEqual(
+                    first.get_many(['version', 'page', 'missing']),
+                    {'version': 6, 'page': {'html': '<p>'}})
+                second.delete('page')
+                self.assertIsNone(first.get('page'))
+                with self.assertRaises(ValueError):
+                    first.incr('missing')
+
+    @skipUnless(hasattr(cache, 'stats'), 'default cache is not two-level')
+    def test_front_cache_serves_repeated_reads(self):
+        """TwoLevelCache отдаёт повторное чтение из памяти процесса."""
+        cache.set('front-key', 'value')
+        hits = cache.stats['front_hits']
+        self.assertEqual(cache.get('front-key'), 'value')
+        self.assertEqual(cache.stats['front_hits'], hits + 1)
+
+    def test_tests_keep_state_outside_base_dir(self):
+        """Тесты не трогают файл кэша, метрики и профили разработчика."""
+        locations = [settings.METRICS_DIR, settings.PROFILER_DIR] + [
+            params['LOCATION'] for params in settings.CACHES.values()
+            if params['BACKEND'] == 'core.cache_backends.SQLiteCache']
+        for location in locations:
+            with self.subTest(location=location):
+                self.assertTrue(location.startswith(settings.STATE_DIR))
+                self.assertFalse(location.startswith(settings.BASE_DIR))
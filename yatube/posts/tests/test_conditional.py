@@ -0,0 +1,114 @@
+from unittest import mock
+
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import caching
+from posts.models import Comment, Follow, Group, Post, User
+from .constants import (
+    INDEX_URL_NAME,
+    GROUP_LIST_URL_NAME,
+    PROFILE_URL_NAME,
+    POST_DETAIL_URL_NAME,
+    FOLLOW_INDEX_URL_NAME,
+)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.urls = (
+            reverse(INDEX_URL_NAME),
+            reverse(GROUP_LIST_URL_NAME, kwargs={'slug': cls.group.slug}),
+            reverse(PROFILE_URL_NAME, kwargs={'username': cls.author}),
+            reverse(POST_DETAIL_URL_NAME, kwargs={'post_id': cls.post.id}),
+            reverse(FOLLOW_INDEX_URL_NAME),
+        )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def etags(self):
+        return {url: self.reader_client.get(url)['ETag'] for url in self.urls}
+
+    def test_not_modified_without_changes(self):
+        '''Повторный запрос с тем же ETag получает 304 без тела.'''
+        for url, etag in self.etags().items():
+            with self.subTest(url=url):
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_etag_changes_with_content(self):
+        '''Правка поста меняет ETag всех страниц, где он виден.'''
+        before = self.etags()
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        after = self.etags()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotEqual(before[url], after[url])
+
+    def test_etag_depends_on_user_and_comments(self):
+        '''ETag разный у разных пользователей и меняется с комментарием.'''
+        url = reverse(POST_DETAIL_URL_NAME, kwargs={'post_id': self.post.id})
+        etag = self.reader_client.get(url)['ETag']
+        self.assertNotEqual(Client().get(url)['ETag'], etag)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unfollow_changes_profile_and_feed(self):
+        '''Отписка меняет ETag профиля автора и ленты подписок.'''
+        before = self.etags()
+        Follow.objects.filter(user=self.reader).delete()
+        after = self.etags()
+        for url in self.urls[2], self.urls[4]:
+            with self.subTest(url=url):
+                self.assertNotEqual(before[url], after[url])
+
+    def test_feed_etag_without_per_follower_bumps(self):
+        '''ETag ленты меняется с новым, изменённым и удалённым постом,
+        а сами эти изменения не пишут версий в кэш для каждой ленты.'''
+        url = reverse(FOLLOW_INDEX_URL_NAME)
+        for number in range(3):
+            Follow.objects.create(
+                user=User.objects.create_user(username=f'reader{number}'),
+                author=self.author)
+        etag = self.reader_client.get(url)['ETag']
+        self.assertEqual(self.reader_client.get(
+            url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with mock.patch.object(
+                caching, 'bump', wraps=caching.bump) as bump:
+            post = Post.objects.create(text='Новый пост', author=self.author)
+            post.text = 'Исправленный пост'
+            post.save()
+            Post.objects.get(id=self.post.id).delete()
+        bumped = {scope for call in bump.call_args_list for scope in call[0]}
+        self.assertLessEqual(bumped, {
+            *caching.post_scopes(post), *caching.post_scopes(self.post)})
+        for change in (
+            lambda: Post.objects.create(text='Ещё пост', author=self.author),
+            lambda: post.save(),
+            lambda: post.delete(),
+        ):
+            etag = self.reader_client.get(url)['ETag']
+            change()
+            with self.subTest(change=change):
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
@@ -0,0 +1,63 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from unittest import skipUnless
+
+from django.db import OperationalError, connections
+from django.test import SimpleTestCase
+
+from core.backends.sqlite3.base import DatabaseWrapper
+
+
+@skipUnless(isinstance(connections['default'], DatabaseWrapper),
+            'default database is not the production SQLite profile')
+class ProductionSQLiteTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'db.sqlite3')
+        with sqlite3.connect(self.path) as setup:
+            setup.execute('PRAGMA journal_mode = wal')
+            setup.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+
+    def wrapper(self, **options):
+        default = connections['default'].settings_dict
+        settings_dict = {
+            **default,
+            'NAME': self.path,
+            'OPTIONS': {**default['OPTIONS'], **options},
+        }
+        wrapper = DatabaseWrapper(settings_dict, 'busy-test')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def hold_write_lock(self, seconds):
+        """Держит блокировку записи из другого соединения seconds секунд."""
+        locker = sqlite3.connect(
+            self.path, isolation_level=None, check_same_thread=False)
+        locker.execute('BEGIN IMMEDIATE')
+        timer = threading.Timer(seconds, locker.execute, ['COMMIT'])
+        timer.start()
+        self.addCleanup(locker.close)
+        self.addCleanup(timer.join)
+
+    def test_pragmas_on_connect(self):
+        '''Новое соединение получает WAL и прагмы из OPTIONS.'''
+        with self.wrapper().cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_busy_writer_retries(self):
+        '''Запись ждёт занятую базу и повторяется, а без повторов падает.'''
+        self.hold_write_lock(0.3)
+        with self.assertRaisesMessage(OperationalError, 'database is locked'):
+            with self.wrapper(timeout=0.01, busy_retries=0).cursor() as c:
+                c.execute('INSERT INTO item DEFAULT VALUES')
+        with self.wrapper(timeout=0.01, busy_retries=8).cursor() as cursor:
+            cursor.execute('INSERT INTO item DEFAULT VALUES')
+            cursor.execute('SELECT COUNT(*) FROM item')
+            self.assertEqual(cursor.fetchone()[0], 1)
@@ -0,0 +1,102 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.query_budget import count_queries
+from posts import following
+from posts.models import FeedEntry, Follow, Post, User, UserStats
+
+AUTHORS = 20
+BATCH_URL_NAME = 'posts:follow_batch'
+
+
+class FollowBatchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{number}')
+            for number in range(AUTHORS)]
+        for author in cls.authors:
+            Post.objects.create(author=author, text=f'Пост {author}')
+        cls.url = reverse(BATCH_URL_NAME)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def batch(self, action, usernames):
+        return self.client.post(
+            self.url, {'action': action, 'username': usernames})
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_follow_batch_is_idempotent(self):
+        '''Пакетная подписка пропускает себя, неизвестных и повторы.'''
+        names = [author.username for author in self.authors[:3]]
+        response = self.batch('follow', names + ['reader', 'nobody'])
+        self.assertEqual(response.json(), {
+            'follow': names, 'unknown': ['nobody']})
+        response = self.batch('follow', names)
+        self.assertEqual(response.json(), {'follow': [], 'unknown': []})
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(self.stats(self.user).following_count, 3)
+        self.assertEqual(self.stats(self.authors[0]).followers_count, 1)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(
+            following.authors(User.objects.get(id=self.user.id)),
+            {author.id for author in self.authors[:3]})
+
+    def test_unfollow_batch(self):
+        '''Пакетная отписка удаляет подписки, ленту и счётчики.'''
+        Follow.objects.follow(
+            self.user, [author.id for author in self.authors[:5]])
+        response = self.batch(
+            'unfollow', [author.username for author in self.authors[:3]])
+        self.assertEqual(len(response.json()['unfollow']), 3)
+        self.assertEqual(
+            set(Follow.objects.values_list('author_id', flat=True)),
+            {author.id for author in self.authors[3:5]})
+        self.assertEqual(self.stats(self.user).following_count, 2)
+        self.assertEqual(self.stats(self.authors[0]).followers_count, 0)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user).count(), 2)
+
+    def test_unfollow_skips_per_row_post_delete(self):
+        '''Отписка — один DELETE без post_delete на каждую подписку.'''
+        Follow.objects.follow(
+            self.user, [author.id for author in self.authors[:3]])
+        with mock.patch('posts.signals.subscriptions_changed') as changed:
+            with count_queries() as queries:
+                Follow.objects.unfollow(
+                    self.user, [author.id for author in self.authors[:3]])
+        changed.assert_not_called()
+        self.assertEqual(len([
+            sql for sql in queries.queries
+            if sql.startswith('DELETE FROM "posts_follow"')]), 1)
+
+    def test_queries_do_not_depend_on_batch_size(self):
+        '''Число запросов не растёт с числом авторов в пакете.'''
+        counts = []
+        for authors in (self.authors[:2], self.authors[2:]):
+            for action in ('follow', 'unfollow'):
+                with count_queries() as queries:
+                    self.batch(
+                        action, [author.username for author in authors])
+                counts.append(queries.count)
+        self.assertEqual(counts[:2], counts[2:])
+
+    def test_bad_requests(self):
+        '''Неизвестное действие, слишком большой пакет и GET отклоняются.'''
+        self.assertEqual(self.batch('block', ['author0']).status_code, 400)
+        too_many = [f'user{number}' for number in range(
+            settings.FOLLOW_BATCH_LIMIT + 1)]
+        self.assertEqual(self.batch('follow', too_many).status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
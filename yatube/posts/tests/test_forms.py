@@ -1,3 +1,4 @@
+import io
 import shutil
 import tempfile
 
@@ -5,6 +6,7 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.forms import PostForm
 from posts.models import Group, Post, User, Comment
@@ -20,7 +22,7 @@ from .constants import (
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -116,6 +118,55 @@ class PostCreateFormTests(TestCase):
         self.assertEqual(
             form_data['image'].name, new_post.image.name.split('/')[1])
 
+    @override_settings(POST_IMAGE_MAX_SIZE=100)
+    def test_create_post_downscales_large_image(self):
+        """Оригинал больше POST_IMAGE_MAX_SIZE уменьшается при загрузке
+        с сохранением пропорций."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 200)).save(buffer, format='JPEG')
+        form_data = {
+            'text': 'Большая картинка',
+            'image': SimpleUploadedFile(
+                name='large.jpg',
+                content=buffer.getvalue(),
+                content_type='image/jpeg'
+            ),
+        }
+        self.authorized_client.post(
+            self.POST_CREATE_URL_REVERSE, data=form_data)
+        new_post = Post.objects.latest('id')
+        self.assertEqual(
+            (new_post.image.width, new_post.image.height), (100, 50))
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0,
+                       POST_IMAGE_MAX_UPLOAD_SIZE=len(IMAGE_PNG) - 1)
+    def test_create_post_rejects_large_file(self):
+        """Файл больше POST_IMAGE_MAX_UPLOAD_SIZE не принимается."""
+        posts_count = Post.objects.count()
+        response = self.authorized_client.post(
+            self.POST_CREATE_URL_REVERSE,
+            data={
+                'text': 'Большой файл',
+                'image': SimpleUploadedFile('big.gif', IMAGE_PNG),
+            }
+        )
+        self.assertEqual(Post.objects.count(), posts_count)
+        self.assertEqual(
+            response.context['form'].errors.as_data()['image'][0].code,
+            'file_too_large')
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1)
+    def test_create_post_rejects_large_resolution(self):
+        """Картинка с разрешением больше POST_IMAGE_MAX_PIXELS
+        отклоняется по заголовку."""
+        form = PostForm(
+            data={'text': 'Большая картинка'},
+            files={'image': SimpleUploadedFile('wide.gif', IMAGE_PNG)}
+        )
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form.errors.as_data()['image'][0].code, 'image_too_large')
+
     def test_not_auth_user_create_post(self):
         '''Невозможность создания поста не авторизированным пользователем.'''
         posts_count = Post.objects.count()
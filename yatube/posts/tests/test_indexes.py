@@ -0,0 +1,72 @@
+from django.db import connection
+from django.test import TestCase
+
+from posts.models import Comment, FeedEntry, Follow, Group, Post, User
+from posts.paginators import CursorPaginator
+
+POST_LIMIT = 10
+
+
+class FeedIndexesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='kir')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.user, group=cls.group)
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_feed_queries_use_indexes_without_sorting(self):
+        """Запросы лент идут по индексу и не сортируют во временном
+        B-дереве."""
+        paginator = CursorPaginator(Post.objects.all(), POST_LIMIT)
+        feed = CursorPaginator(
+            FeedEntry.objects.filter(user=self.user).select_related(
+                'post__author', 'post__group'),
+            POST_LIMIT, ordering=('-pub_date', 'id'))
+        queries = {
+            'index': Post.objects.all()[:POST_LIMIT],
+            'index cursor': paginator.object_list.filter(
+                paginator._after([self.post.pub_date, self.post.id])
+            )[:POST_LIMIT],
+            'group_list': self.group.posts.all()[:POST_LIMIT],
+            'profile': self.user.posts.all()[:POST_LIMIT],
+            'profile cursor': self.user.posts.order_by(
+                '-pub_date', '-id')[:POST_LIMIT],
+            'follow_index': Post.objects.filter(
+                feed_entries__user=self.user
+            ).order_by('-feed_entries__pub_date')[:POST_LIMIT],
+            'follow_index cursor': feed.object_list.filter(
+                feed._after([self.post.pub_date, self.post.id])
+            )[:POST_LIMIT],
+            'follow_index cursor back': feed.object_list.filter(
+                feed._before([self.post.pub_date, self.post.id])
+            ).order_by(*feed._reversed())[:POST_LIMIT],
+            'post_detail comments': Comment.objects.filter(
+                post=self.post).order_by('-created', '-id')[:POST_LIMIT],
+            'feed trim': FeedEntry.objects.filter(
+                user=self.user
+            ).order_by('-pub_date', 'id').values('id')[1000:1001],
+            'fan-out followers': Follow.objects.filter(
+                author=self.user).values_list('user_id', flat=True),
+            'following check': Follow.objects.filter(
+                author=self.user, user=self.user),
+        }
+        for name, queryset in queries.items():
+            with self.subTest(query=name):
+                plan = self.query_plan(queryset)
+                self.assertTrue(
+                    any('USING' in step and 'INDEX' in step
+                        for step in plan), plan)
+                self.assertFalse(
+                    any('TEMP B-TREE' in step for step in plan), plan)
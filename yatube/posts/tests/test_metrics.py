@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from posts.models import Post, User
+from .constants import INDEX_URL_NAME
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        # Свой каталог на тест: файлы потоков открываются в нём заново.
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(METRICS_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        self.guest = Client()
+
+    def test_request_metrics(self):
+        '''Страница метрик отдаёт ответы, задержки, SQL и кэш фрагментов.'''
+        for _ in range(2):
+            self.guest.get(reverse(INDEX_URL_NAME))
+        response = self.guest.get(reverse('metrics'))
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        for line in (
+            'yatube_http_responses_total'
+            '{view="posts:index",status="200"} 2',
+            'yatube_http_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 2',
+            'yatube_http_request_duration_seconds_count'
+            '{view="posts:index"} 2',
+            'yatube_fragment_cache_requests_total'
+            '{fragment="index_page",result="miss"} 1',
+            'yatube_fragment_cache_requests_total'
+            '{fragment="index_page",result="hit"} 1',
+            '# TYPE yatube_upload_size_bytes histogram',
+        ):
+            with self.subTest(line=line):
+                self.assertContains(response, line)
+        self.assertRegex(
+            response.content.decode(),
+            r'yatube_db_queries_total\{view="posts:index"\} [1-9]')
+
+    def test_sum_across_processes(self):
+        '''Значения из разных процессов складываются.'''
+        counter = metrics.RESPONSES
+        counter.inc(view='test', status=200)
+        pid = os.fork()
+        if pid == 0:
+            counter.inc(2, view='test', status=200)
+            os._exit(0)
+        os.waitpid(pid, 0)
+        key = 'yatube_http_responses_total{view="test",status="200"}'
+        self.assertEqual(metrics.collect()[key], 3)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_file_grows(self):
+        '''Файл потока расширяется, когда ключи в него не помещаются.'''
+        for number in range(3000):
+            metrics.DB_QUERIES.inc(number, view=f'view-{number}')
+        totals = metrics.collect()
+        self.assertEqual(
+            totals['yatube_db_queries_total{view="view-2999"}'], 2999)
+        self.assertEqual(len(totals), 3000)
+
+    def test_metrics_only_for_allowed_ips_and_staff(self):
+        '''С чужого адреса метрики видит только сотрудник.'''
+        remote = {'REMOTE_ADDR': '203.0.113.5'}
+        self.assertEqual(
+            self.guest.get(reverse('metrics'), **remote).status_code, 403)
+        user = Client()
+        user.force_login(self.user)
+        self.assertEqual(
+            user.get(reverse('metrics'), **remote).status_code, 403)
+        staff = Client()
+        staff.force_login(self.admin)
+        self.assertEqual(
+            staff.get(reverse('metrics'), **remote).status_code, 200)
+
+    def test_dead_process_files_are_compacted(self):
+        '''Файлы завершившихся процессов сливаются в archive.db.'''
+        counter = metrics.RESPONSES
+        counter.inc(view='test', status=200)
+        for amount in (2, 3):
+            pid = os.fork()
+            if pid == 0:
+                counter.inc(amount, view='test', status=200)
+                os._exit(0)
+            os.waitpid(pid, 0)
+        metrics.compact()
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.directory)
+                   if name.endswith('.db')),
+            [os.path.basename(metrics._file().path), metrics.ARCHIVE])
+        key = 'yatube_http_responses_total{view="test",status="200"}'
+        self.assertEqual(metrics.collect()[key], 6)
+
+    def test_finished_threads_share_files(self):
+        '''Поток получает файл завершившегося потока, а не новый.'''
+        for _ in range(3):
+            thread = threading.Thread(
+                target=metrics.DB_QUERIES.inc, kwargs={'view': 'test'})
+            thread.start()
+            thread.join()
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        self.assertEqual(
+            metrics.collect()['yatube_db_queries_total{view="test"}'], 3)
@@ -1,6 +1,7 @@
 from django.test import TestCase
 
-from posts.models import Group, Post, User, Comment, Follow, LIMIT
+from posts import counters
+from posts.models import Group, Post, User, UserStats, Comment, Follow, LIMIT
 
 
 class PostAndGroupModelTest(TestCase):
@@ -69,3 +70,55 @@ class PostAndGroupModelTest(TestCase):
                 self.assertEqual(
                     self.post._meta.get_field(field).help_text, expected_value
                 )
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='kir')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def assertCounters(self):
+        self.user.stats.refresh_from_db()
+        self.author.stats.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, 2)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.assertEqual(self.user.stats.following_count, 1)
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).comments_count, 1)
+
+    def create_objects(self):
+        self.post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group)
+        Post.objects.create(author=self.author, text='Второй пост')
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий')
+        Follow.objects.create(user=self.user, author=self.author)
+
+    def test_counters_follow_signals(self):
+        """Счётчики обновляются сигналами при создании и удалении."""
+        self.create_objects()
+        self.assertCounters()
+        self.post.delete()
+        self.group.refresh_from_db()
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.author.stats.posts_count, 1)
+
+    def test_recount_repairs_counters(self):
+        """recount восстанавливает испорченные счётчики."""
+        self.create_objects()
+        UserStats.objects.update(
+            posts_count=0, followers_count=0, following_count=0)
+        Group.objects.update(posts_count=7)
+        Post.objects.update(comments_count=0)
+        counters.recount()
+        self.assertCounters()
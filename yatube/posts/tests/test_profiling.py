@@ -0,0 +1,93 @@
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.profiling import RequestProfile, watch_caches
+from posts.models import Post, User
+from .constants import INDEX_URL_NAME, POST_DETAIL_URL_NAME
+
+PROFILER_DIR = tempfile.mkdtemp()
+
+
+@override_settings(PROFILER_DIR=PROFILER_DIR)
+class RequestProfilerTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(PROFILER_DIR, ignore_errors=True)
+
+    def setUp(self):
+        shutil.rmtree(PROFILER_DIR, ignore_errors=True)
+        self.staff = Client()
+        self.staff.force_login(self.admin)
+
+    def test_staff_profile_is_stored_and_shown(self):
+        '''Профиль по ?profile=1 сохраняется и открывается в админке.'''
+        response = self.staff.get(
+            reverse(POST_DETAIL_URL_NAME, kwargs={'post_id': self.post.id}),
+            {'profile': 1})
+        profile_id = int(response['X-Profile-Id'])
+        detail = self.staff.get(
+            reverse('core:profile_detail', kwargs={'profile_id': profile_id}))
+        profile = detail.context['profile']
+        self.assertEqual(profile['view'], POST_DETAIL_URL_NAME)
+        self.assertTrue(profile['sql'])
+        self.assertIn('posts/post_detail.html',
+                      {row['name'] for row in profile['templates']})
+        self.assertTrue(profile['cache']['keys'])
+        self.assertIn('cumulative', profile['profile'])
+        self.assertContains(
+            self.staff.get(reverse('core:profile_list')), '?profile=1')
+
+    def test_header_triggers_profile(self):
+        '''Заголовок X-Profile работает так же, как параметр.'''
+        response = self.staff.get(
+            reverse(INDEX_URL_NAME), HTTP_X_PROFILE='1')
+        self.assertIn('X-Profile-Id', response)
+
+    def test_not_staff_not_profiled(self):
+        '''Обычному пользователю профиль не снимается и не показывается.'''
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse(INDEX_URL_NAME), {'profile': 1})
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(
+            client.get(reverse('core:profile_list')).status_code, 302)
+
+    @override_settings(PROFILER_SAMPLE_RATE=1, PROFILER_SLOTS=3)
+    def test_sampling_ring_buffer(self):
+        '''Выборка профилирует всех, буфер хранит последние профили.'''
+        guest = Client()
+        ids = [
+            int(guest.get(reverse(INDEX_URL_NAME))['X-Profile-Id'])
+            for _ in range(5)
+        ]
+        profiles = self.staff.get(
+            reverse('core:profile_list')).context['profiles']
+        self.assertEqual(
+            [profile['id'] for profile in profiles], ids[:-4:-1])
+        self.assertEqual(self.staff.get(reverse(
+            'core:profile_detail', kwargs={'profile_id': ids[0]}
+        )).status_code, 404)
+
+    def test_two_level_cache_miss_counted_once(self):
+        '''Промах двухуровневого кэша учитывается один раз.'''
+        profile = RequestProfile()
+        with watch_caches(profile):
+            cache.get('profiling:missing')
+            cache.get_many(['profiling:missing', 'profiling:other'])
+        self.assertEqual(profile.cache, [
+            ('profiling:missing', False),
+            ('profiling:missing', False),
+            ('profiling:other', False)])
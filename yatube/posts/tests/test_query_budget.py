@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.query_budget import count_queries, query_budget
+from posts import following
+from posts.models import Comment, Follow, Group, Post, User
+from .constants import (
+    INDEX_URL_NAME,
+    GROUP_LIST_URL_NAME,
+    PROFILE_URL_NAME,
+    POST_DETAIL_URL_NAME,
+    FOLLOW_INDEX_URL_NAME,
+)
+
+TEST_OF_POST = 15
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(TEST_OF_POST):
+            cls.post = Post.objects.create(
+                text=f'Тестовый пост {i}', author=cls.author, group=cls.group)
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Комментарий {i}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.urls = (
+            (INDEX_URL_NAME, reverse(INDEX_URL_NAME)),
+            (GROUP_LIST_URL_NAME, reverse(
+                GROUP_LIST_URL_NAME, kwargs={'slug': cls.group.slug})),
+            (PROFILE_URL_NAME, reverse(
+                PROFILE_URL_NAME, kwargs={'username': cls.author})),
+            (POST_DETAIL_URL_NAME, reverse(
+                POST_DETAIL_URL_NAME, kwargs={'post_id': cls.post.id})),
+            (FOLLOW_INDEX_URL_NAME, reverse(FOLLOW_INDEX_URL_NAME)),
+        )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_views_fit_query_budget_with_cold_cache(self):
+        """Страницы укладываются в бюджет запросов и без кэша."""
+        for url_name, url in self.urls:
+            with self.subTest(url_name=url_name):
+                cache.clear()
+                with query_budget(url_name):
+                    response = self.reader_client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_follow_state_comes_from_cache(self):
+        """Флаг подписки на профиле и кнопки в лентах не читают подписки
+        из базы, пока их набор лежит в кэше."""
+        cache.clear()
+        following.load(self.reader.id)
+        for url_name, url in self.urls[:3]:
+            with self.subTest(url_name=url_name):
+                with count_queries() as queries:
+                    response = self.reader_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(
+                    [sql for sql in queries.queries if 'posts_follow' in sql])
+
+    @override_settings(
+        QUERY_BUDGET_ENABLED=True, QUERY_BUDGETS={INDEX_URL_NAME: 1})
+    def test_middleware_logs_views_over_budget(self):
+        """Включённый QueryBudgetMiddleware пишет в лог превышение."""
+        cache.clear()
+        with self.assertLogs('yatube.query_budget', 'WARNING') as logs:
+            Client().get(reverse(INDEX_URL_NAME))
+        self.assertIn(f'GET {INDEX_URL_NAME}: ', logs.output[0])
+        self.assertIn('при бюджете 1', logs.output[0])
@@ -0,0 +1,84 @@
+from array import array
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import recommendations
+from posts.models import Follow, Post, Recommendation, User
+from .constants import FOLLOW_INDEX_URL_NAME, PROFILE_URL_NAME
+
+
+class RecommendationTests(TestCase):
+    '''reader → first, second; first → active, quiet, second;
+    second → active. Кандидаты reader: active (два пути, есть посты)
+    и quiet (один путь, постов нет).'''
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader, cls.first, cls.second, cls.active, cls.quiet = [
+            User.objects.create_user(username=name)
+            for name in ('reader', 'first', 'second', 'active', 'quiet')]
+        for user, author in (
+                (cls.reader, cls.first), (cls.reader, cls.second),
+                (cls.first, cls.active), (cls.first, cls.quiet),
+                (cls.first, cls.second), (cls.second, cls.active)):
+            Follow.objects.create(user=user, author=author)
+        Post.objects.create(author=cls.active, text='Пост активного автора')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def recommended(self, user):
+        return list(Recommendation.objects.filter(
+            user=user).values_list('author__username', flat=True))
+
+    def test_friends_of_friends_ranked_by_paths_and_activity(self):
+        '''Кандидаты — авторы авторов, без себя и уже прочитанных.'''
+        call_command('recommend_follows', stdout=StringIO())
+        self.assertEqual(self.recommended(self.reader), ['active', 'quiet'])
+        self.assertEqual(self.recommended(self.first), [])
+        self.assertEqual(self.recommended(self.second), [])
+        graph = recommendations.FollowGraph.load()
+        self.assertEqual(
+            list(graph.following(self.first.id)),
+            sorted([self.active.id, self.quiet.id, self.second.id]))
+
+    def test_rebuild_replaces_stale_rows(self):
+        '''Пересчёт убирает рекомендации тех, кто отписался от всех.'''
+        recommendations.rebuild(batch_size=2)
+        Follow.objects.filter(user=self.reader).delete()
+        recommendations.rebuild(batch_size=2)
+        self.assertEqual(self.recommended(self.reader), [])
+
+    def test_fanout_limits_candidates(self):
+        '''Из длинных списков подписок берётся равномерная выборка.'''
+        self.assertEqual(
+            list(recommendations.sample(array('I', range(10)), 3)),
+            [0, 4, 8])
+        graph = recommendations.FollowGraph.load()
+        weights = recommendations.activity(graph.size, 30)
+        self.assertLessEqual(len(recommendations.recommend(
+            graph, weights, self.reader.id, top=10, fanout=1)), 1)
+
+    def test_widget_on_follow_index_and_profile(self):
+        '''Виджет показывает рекомендации и прячет уже прочитанных.'''
+        recommendations.rebuild()
+        urls = (
+            reverse(FOLLOW_INDEX_URL_NAME),
+            reverse(PROFILE_URL_NAME, kwargs={'username': self.first}),
+        )
+        follow_active = reverse(
+            'posts:profile_follow', kwargs={'username': self.active})
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), follow_active)
+        self.client.get(follow_active)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.client.get(url), follow_active)
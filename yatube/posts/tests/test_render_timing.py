@@ -0,0 +1,51 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.render_timing import totals
+from posts.models import Post, User
+from .constants import INDEX_URL_NAME
+
+
+@override_settings(RENDER_TIMING_ENABLED=True)
+class RenderTimingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {number}')
+            for number in range(3)
+        )
+
+    def setUp(self):
+        cache.clear()
+        totals.clear()
+        self.guest = Client()
+
+    def test_server_timing_header(self):
+        '''Ответ сообщает время отрисовки и самые долгие шаблоны.'''
+        response = self.guest.get(reverse(INDEX_URL_NAME))
+        self.assertTrue(response['Server-Timing'].startswith('render;dur='))
+        self.assertIn('template;desc=', response['Server-Timing'])
+
+    def test_totals_per_url_name(self):
+        '''Шаблоны и теги копятся по URL name в среднем на запрос.'''
+        for _ in range(2):
+            self.guest.get(reverse(INDEX_URL_NAME))
+        (url_name, requests, _, templates, tags), = totals.report()
+        self.assertEqual((url_name, requests), (INDEX_URL_NAME, 2))
+        calls = {row['name']: row['calls'] for row in templates + tags}
+        self.assertEqual(calls['base.html'], 1)
+        # Второй запрос берёт список постов из кэша фрагмента.
+        self.assertEqual(calls['includes/article.html'], 1.5)
+        self.assertEqual(calls['post_thumbnail'], 1.5)
+        self.assertTrue(all(
+            row['own_ms'] <= row['ms'] for row in templates + tags))
+        client = Client()
+        client.force_login(self.admin)
+        self.assertContains(
+            client.get(reverse('core:render_timing')),
+            'includes/article.html')
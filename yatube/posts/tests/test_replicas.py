@@ -0,0 +1,79 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import db_routers
+from core.db_routers import STICKY_SESSION_KEY
+from posts import following
+from posts.models import Follow, Post, User
+from .constants import (
+    INDEX_URL_NAME, POST_DETAIL_URL_NAME, PROFILE_URL_NAME)
+
+# Тестовая база из settings: схема есть, данных тестов нет.
+REPLICA = 'lagging_replica'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(TestCase):
+    '''Реплика — отдельная база со схемой, но без данных тестов.'''
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_read_only_views_use_replica(self):
+        '''Лента читается с реплики, где поста ещё нет.'''
+        response = self.client.get(reverse(INDEX_URL_NAME))
+        self.assertEqual(len(response.context['page_obj']), 0)
+        response = self.client.get(
+            reverse(POST_DETAIL_URL_NAME, kwargs={'post_id': self.post.id}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_session_sticks_to_primary_after_write(self):
+        '''После записи сессия читает с основной базы.'''
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'})
+        self.assertRedirects(response, reverse(
+            PROFILE_URL_NAME, kwargs={'username': self.user.username}))
+        response = self.client.get(reverse(
+            PROFILE_URL_NAME, kwargs={'username': self.user.username}))
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertEqual(
+            len(Client().get(reverse(INDEX_URL_NAME)).context['page_obj']),
+            0)
+
+    def test_replica_pages_are_not_cached(self):
+        '''Страница с реплики не оставляет фрагментов и не получает ETag.'''
+        response = self.client.get(reverse(INDEX_URL_NAME))
+        self.assertEqual(len(response.context['page_obj']), 0)
+        self.assertFalse(response.has_header('ETag'))
+        primary = Client()
+        primary.force_login(self.user)
+        session = primary.session
+        session[STICKY_SESSION_KEY] = time.time() + 60
+        session.save()
+        response = primary.get(reverse(INDEX_URL_NAME))
+        self.assertContains(response, self.post.text)
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_following_read_from_replica_is_not_cached(self):
+        '''Набор подписок, прочитанный с реплики, не попадает в кэш.'''
+        Follow.objects.create(user=self.user, author=self.author)
+        cache.clear()
+        with mock.patch.object(
+                db_routers._state, 'replica', REPLICA, create=True):
+            self.assertEqual(following.load(self.user.id), frozenset())
+        self.assertEqual(
+            following.authors(User.objects.get(id=self.user.id)),
+            {self.author.id})
@@ -0,0 +1,98 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post, User
+from posts.stemmer import stem
+
+SEARCH_URL_NAME = 'posts:search'
+
+
+class StemmerTests(TestCase):
+    def test_stem(self):
+        '''Формы слова сводятся к одной основе.'''
+        for words in (
+            ('кошки', 'кошкам', 'кошка'),
+            ('посты', 'постами', 'постов'),
+            ('красивая', 'красивейший'),
+        ):
+            with self.subTest(words=words):
+                self.assertEqual(len({stem(word) for word in words}), 1)
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        cls.cat_post = Post.objects.create(
+            author=cls.user, text='Сегодня гуляли с кошкой по парку.')
+        cls.dog_post = Post.objects.create(
+            author=cls.user, text='Собаки лают, а караван идёт.')
+        cls.SEARCH_URL_REVERSE = reverse(SEARCH_URL_NAME)
+
+    def setUp(self):
+        self.guest = Client()
+
+    def get_results(self, query, **params):
+        response = self.guest.get(
+            self.SEARCH_URL_REVERSE, {'q': query, **params})
+        return response, list(response.context['page_obj'])
+
+    def test_search_finds_other_word_forms(self):
+        '''Поиск находит пост по другой форме слова и подсвечивает его.'''
+        response, results = self.get_results('кошки')
+        self.assertEqual(results, [self.cat_post])
+        self.assertContains(response, '<mark>кошкой</mark>')
+
+    def test_index_follows_edit_and_delete(self):
+        '''Индекс обновляется при правке и удалении поста.'''
+        self.dog_post.text = 'Коты спят весь день.'
+        self.dog_post.save()
+        self.assertEqual(self.get_results('собака')[1], [])
+        self.assertEqual(self.get_results('кот')[1], [self.dog_post])
+        self.dog_post.delete()
+        self.assertEqual(self.get_results('кот')[1], [])
+
+    def test_ranked_cursor_pages(self):
+        '''Результаты листаются курсором без повторов и пропусков.'''
+        Post.objects.bulk_create(
+            Post(author=self.user, text='кошка ' * (number % 3 + 1))
+            for number in range(settings.POSTS_PER_PAGE + 5)
+        )
+        search.rebuild()
+        _, first = self.get_results('кошка')
+        cursor = self.guest.get(
+            self.SEARCH_URL_REVERSE, {'q': 'кошка'}
+        ).context['page_obj'].next_cursor
+        _, second = self.get_results('кошка', cursor=cursor)
+        self.assertEqual(len(first), settings.POSTS_PER_PAGE)
+        self.assertEqual(len(second), 6)
+        found = {post.id for post in first + second}
+        self.assertEqual(len(found), settings.POSTS_PER_PAGE + 6)
+        # bm25 ставит выше посты, где слово встречается чаще.
+        self.assertEqual(first[0].text.count('кошка'), 3)
+
+    def test_admin_search_uses_index(self):
+        '''Поиск в админке находит посты через тот же индекс.'''
+        client = Client()
+        client.force_login(self.admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собаку'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.dog_post])
+
+    def test_rebuild_command(self):
+        '''Команда пересобирает индекс с нуля.'''
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        self.assertEqual(self.get_results('кошка')[1], [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.get_results('кошка')[1], [self.cat_post])
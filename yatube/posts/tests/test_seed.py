@@ -0,0 +1,62 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from posts.models import Comment, FeedEntry, Follow, Group, Post, User
+from posts.urls import app_name, urlpatterns
+
+
+class SeedDataTests(TestCase):
+    def test_seed_data(self):
+        '''Команда создаёт данные заданного размера и производные от них
+        счётчики и ленты подписок.'''
+        call_command(
+            'seed_data', posts=200, users=20, groups=3, follows=5,
+            comments=2, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Comment.objects.count(), 400)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(FeedEntry.objects.exists())
+        for user in User.objects.select_related('stats'):
+            self.assertEqual(user.stats.posts_count, user.posts.count())
+        self.assertEqual(
+            list(Post.objects.values_list('pub_date', flat=True)),
+            sorted(Post.objects.values_list('pub_date', flat=True),
+                   reverse=True))
+
+
+class BenchmarkViewsTests(SimpleTestCase):
+    def test_benchmark_views_covers_every_url(self):
+        '''benchmark_views проходит по всем URL приложения без ошибок.
+
+        Команда переключает соединения на свои файлы баз, поэтому
+        запускается отдельным процессом, а не на тестовой базе в памяти.
+        '''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        output = os.path.join(directory, 'benchmark.json')
+        subprocess.run(
+            [sys.executable, 'manage.py', 'benchmark_views',
+             '--sizes', '100', '--requests', '2', '--follow-batch', '3',
+             '--data-dir', directory, '--output', output],
+            cwd=settings.BASE_DIR, check=True, stdout=subprocess.DEVNULL,
+            env={**os.environ, 'YATUBE_CACHE': 'locmem',
+                 'YATUBE_METRICS_DIR': os.path.join(directory, 'metrics')})
+        with open(output) as results:
+            measured = json.load(results)['sizes']['100']
+        self.assertEqual(
+            set(measured),
+            {f'{app_name}:{pattern.name}' for pattern in urlpatterns})
+        for name, row in measured.items():
+            with self.subTest(name=name):
+                self.assertEqual(row['errors'], 0)
@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import counters
+from posts.models import Comment, Follow, Post, User, UserStats
+from .constants import (
+    FOLLOW_INDEX_URL_NAME, POST_COMMENT_URL_NAME, POST_DETAIL_URL_NAME,
+    PROFILE_FOLLOW_URL_NAME, PROFILE_UNFOLLOW_URL_NAME, PROFILE_URL_NAME)
+
+COMMENTS = 'test_comments'
+FOLLOWS = 'test_follows'
+
+
+class SplitDatabasesTests(TestCase):
+    '''Комментарии и подписки — в отдельных файлах SQLite.'''
+    databases = {'default', COMMENTS, FOLLOWS}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.split = override_settings(DATABASE_SPLIT_MODELS={
+            'posts.comment': COMMENTS,
+            'posts.follow': FOLLOWS,
+        })
+        cls.split.enable()
+        primary = connections['default'].settings_dict
+        for alias in (COMMENTS, FOLLOWS):
+            settings.DATABASES[alias] = {
+                **primary,
+                'NAME': os.path.join(cls.directory, f'{alias}.sqlite3'),
+            }
+            call_command('migrate', database=alias, verbosity=0)
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Тестовый пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.split.disable()
+        for alias in (COMMENTS, FOLLOWS):
+            connections[alias].close()
+            delattr(connections._connections, alias)
+            del settings.DATABASES[alias]
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def follow(self):
+        return self.client.get(reverse(
+            PROFILE_FOLLOW_URL_NAME,
+            kwargs={'username': self.author.username}))
+
+    def test_comments_live_in_their_database(self):
+        '''Комментарий пишется в свою базу и выводится с автором.'''
+        self.client.post(
+            reverse(POST_COMMENT_URL_NAME, kwargs={'post_id': self.post.id}),
+            {'text': 'Комментарий'})
+        self.assertEqual(Comment.objects.using(COMMENTS).count(), 1)
+        self.assertEqual(Comment.objects.using('default').count(), 0)
+        response = self.client.get(
+            reverse(POST_DETAIL_URL_NAME, kwargs={'post_id': self.post.id}))
+        comment = response.context['comments'][0]
+        self.assertEqual(comment.author, self.reader)
+        self.assertContains(response, 'Комментарий')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+    def test_follow_pages_without_cross_database_joins(self):
+        '''Подписка, лента, профиль и отписка работают через две базы.'''
+        self.follow()
+        self.assertEqual(Follow.objects.using(FOLLOWS).count(), 1)
+        self.assertEqual(Follow.objects.using('default').count(), 0)
+        response = self.client.get(reverse(FOLLOW_INDEX_URL_NAME))
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+        response = self.client.get(reverse(
+            PROFILE_URL_NAME, kwargs={'username': self.author.username}))
+        self.assertTrue(response.context['following'])
+        self.client.get(reverse(
+            PROFILE_UNFOLLOW_URL_NAME,
+            kwargs={'username': self.author.username}))
+        self.assertFalse(Follow.objects.exists())
+
+    def test_deletes_cascade_into_split_databases(self):
+        '''Удаление поста и пользователя чистит отдельные базы.'''
+        post = Post.objects.create(author=self.author, text='Другой пост')
+        Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        post.delete()
+        self.assertFalse(Comment.objects.exists())
+        follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=follower, author=self.author)
+        follower.delete()
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0)
+
+    def test_recount_across_databases(self):
+        '''recount считает подписки и комментарии из других баз.'''
+        self.follow()
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        UserStats.objects.update(followers_count=7, following_count=7)
+        Post.objects.update(comments_count=7)
+        counters.recount()
+        self.assertEqual(UserStats.objects.get(
+            user=self.author).followers_count, 1)
+        self.assertEqual(UserStats.objects.get(
+            user=self.reader).following_count, 1)
+        self.assertEqual(UserStats.objects.get(
+            user=self.author).following_count, 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
@@ -1,14 +1,21 @@
+import base64
+import json
 import shutil
 import tempfile
 
 from django.core.cache import cache
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django import forms
+from sorl import thumbnail
 
-from posts.models import Group, Post, User, Follow
+from posts import counters, thumbnails
+from posts.models import (
+    Comment, FeedEntry, Follow, Group, Post, User, UserStats)
 from .constants import (
     INDEX_URL_NAME,
     GROUP_LIST_URL_NAME,
@@ -29,7 +36,7 @@ MIN_POST_LIMIT = 3
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostPagesTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -170,17 +177,115 @@ class PostPagesTests(TestCase):
         self.assertEqual(len(response.context['page_obj']), 0)
 
     def test_caches_in_index(self):
-        '''Тестирование кэша в index'''
+        '''Тестирование кэша в index: страница берётся из кэша,
+        а изменения постов видны сразу.'''
+        response = self.authorized_client.get(self.INDEX_URL_REVERSE)
+        with CaptureQueriesContext(connection) as queries:
+            response2 = self.authorized_client.get(self.INDEX_URL_REVERSE)
+        self.assertEqual(response.content, response2.content)
+        self.assertFalse(any(
+            'FROM "posts_post"' in query['sql'] for query in queries))
         post = Post.objects.create(
-            text='Текст',
+            text='Свежий пост',
             author=self.user)
-        response = self.authorized_client.get(self.INDEX_URL_REVERSE)
+        response3 = self.authorized_client.get(self.INDEX_URL_REVERSE)
+        self.assertContains(response3, post.text)
         post.delete()
-        response2 = self.authorized_client.get(self.INDEX_URL_REVERSE)
-        self.assertEqual(response.content, response2.content,)
+        response4 = self.authorized_client.get(self.INDEX_URL_REVERSE)
+        self.assertNotContains(response4, post.text)
+
+    def test_post_cards_invalidated_by_author_and_group(self):
+        '''Карточки постов кэшируются, но переименование автора
+        и правка поста сразу видны в лентах.'''
+        self.authorized_client.get(self.PROFILE_URL_REVERSE)
+        self.user.first_name = 'Кирилл'
+        self.user.save()
+        response = self.authorized_client.get(self.INDEX_URL_REVERSE)
+        self.assertContains(response, 'Кирилл')
+        Post.objects.filter(pk=self.post.pk).update(text='Старый текст')
+        response = self.authorized_client.get(self.GROUP_LIST_URL_REVERSE)
+        self.assertNotContains(response, 'Старый текст')
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный текст'
+        post.save()
+        response = self.authorized_client.get(self.PROFILE_URL_REVERSE)
+        self.assertContains(response, 'Исправленный текст')
+        self.assertNotContains(response, 'Старый текст')
+
+    def test_post_detail_queries_do_not_depend_on_comments(self):
+        '''Число запросов post_detail не растёт с числом комментариев,
+        а комментарии выводятся постранично.'''
+        def count_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.authorized_client.get(
+                    self.POST_DETAIL_URL_REVERSE)
+            return len(queries), response
+
+        Comment.objects.create(
+            post=self.post, author=self.not_author, text='Первый')
+        count_queries()  # прогрев: миниатюра и её запись в sorl
+        few, _ = count_queries()
+        Comment.objects.bulk_create(
+            Comment(post=self.post, text=f'Комментарий {i}',
+                    author=User.objects.create_user(username=f'c{i}'))
+            for i in range(settings.COMMENTS_PER_PAGE + 5)
+        )
+        many, response = count_queries()
+        self.assertEqual(few, many)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), settings.COMMENTS_PER_PAGE)
+        self.assertTrue(comments.has_next())
+
+    def test_post_detail_bad_cursor_shows_newest_comments(self):
+        '''Подделанный курсор комментариев даёт первую страницу:
+        самые новые комментарии, а не ошибку 500.'''
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.not_author,
+                    text=f'Комментарий {i}')
+            for i in range(settings.COMMENTS_PER_PAGE + 2)
+        )
+        newest = list(self.post.comments.order_by('-created', '-id')[
+            :settings.COMMENTS_PER_PAGE])
+        for cursor in BAD_CURSORS:
+            with self.subTest(cursor=cursor):
+                response = self.authorized_client.get(
+                    self.POST_DETAIL_URL_REVERSE, {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(list(response.context['comments']), newest)
+
+    def test_fragment_key_ignores_unrelated_query_parameters(self):
+        '''Посторонние параметры запроса не создают новых фрагментов:
+        страница берётся из кэша, записанного для другого query string.'''
+        for _ in range(2):
+            self.authorized_client.get(self.INDEX_URL_REVERSE + '?x=1')
+        for params in ('?x=2', '?page=1&utm=3', ''):
+            with self.subTest(params=params):
+                with CaptureQueriesContext(connection) as queries:
+                    self.authorized_client.get(
+                        self.INDEX_URL_REVERSE + params)
+                self.assertFalse(any(
+                    'FROM "posts_post"' in query['sql']
+                    for query in queries))
+
+    def test_thumbnail_placeholder_until_generated(self):
+        '''Пока миниатюра не готова, выводится заглушка, и отрисовка
+        страницы сама её не создаёт; готовая миниатюра появляется
+        на странице без ручной очистки кэша.'''
+        thumbnail.delete(self.post.image, delete_file=False)
         cache.clear()
-        response3 = self.authorized_client.get(self.INDEX_URL_REVERSE)
-        self.assertNotEqual(response2.content, response3.content,)
+        for _ in range(2):
+            response = self.authorized_client.get(
+                self.POST_DETAIL_URL_REVERSE)
+            self.assertContains(response, 'bg-light')
+            self.assertNotContains(response, 'card-img my-2" src=')
+        # Так миниатюры создаёт schedule_on_commit после сохранения поста.
+        thumbnails.generate(*thumbnails._job(self.post))
+        response = self.authorized_client.get(self.POST_DETAIL_URL_REVERSE)
+        self.assertContains(response, 'card-img my-2" src=')
+        self.assertContains(response, 'type="image/webp"')
+        for width in settings.POST_IMAGE_WIDTHS:
+            self.assertContains(response, f' {width}w', count=2)
 
     def test_follow_for_auth_user(self):
         '''Авторизованный пользователь может подписываться на
@@ -218,6 +323,110 @@ class PostPagesTests(TestCase):
         response2 = self.another_client.get(self.FOLLOW_INDEX_URL_REVERSE)
         self.assertNotIn(self.post, response2.context['page_obj'])
 
+    def test_feed_filled_on_post_and_trimmed_on_unfollow(self):
+        """Новый пост автора раскладывается в ленты подписчиков,
+        а после отписки посты автора из ленты пропадают."""
+        self.authorized_client.post(self.PROFILE_FOLLOW_URL_REVERSE)
+        post = Post.objects.create(
+            text='Пост для ленты', author=self.not_author)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.user, post=post).exists())
+        response = self.authorized_client.get(self.FOLLOW_INDEX_URL_REVERSE)
+        self.assertIn(post, response.context['page_obj'])
+        self.authorized_client.post(self.PROFILE_UNFOLLOW_URL_REVERSE)
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+        response = self.authorized_client.get(self.FOLLOW_INDEX_URL_REVERSE)
+        self.assertNotIn(post, response.context['page_obj'])
+
+    @override_settings(FEED_LENGTH=MIN_POST_LIMIT)
+    def test_feed_trimmed_to_feed_length_on_new_posts(self):
+        """Новые посты вытесняют из ленты самые старые записи."""
+        self.authorized_client.post(self.PROFILE_FOLLOW_URL_REVERSE)
+        posts = [
+            Post.objects.create(text=f'Пост {number}', author=self.not_author)
+            for number in range(MIN_POST_LIMIT + 2)]
+        self.assertEqual(
+            list(FeedEntry.objects.filter(
+                user=self.user).values_list('post_id', flat=True)),
+            [post.id for post in posts[::-1][:MIN_POST_LIMIT]])
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).feed_count,
+            MIN_POST_LIMIT)
+
+    def test_feed_count_follows_feed_without_count_query(self):
+        """Счётчик ленты меняется вместе с ней, а /follow/ не считает
+        строки ленты."""
+        def feed_count():
+            return UserStats.objects.get(user=self.user).feed_count
+
+        self.authorized_client.post(self.PROFILE_FOLLOW_URL_REVERSE)
+        self.assertEqual(feed_count(), 0)
+        post = Post.objects.create(text='Пост', author=self.not_author)
+        Post.objects.create(text='Ещё пост', author=self.not_author)
+        self.assertEqual(feed_count(), 2)
+        post.delete()
+        self.assertEqual(feed_count(), 1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(
+                self.FOLLOW_INDEX_URL_REVERSE)
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+        self.authorized_client.post(self.PROFILE_UNFOLLOW_URL_REVERSE)
+        self.assertEqual(feed_count(), 0)
+
+    def test_follow_buttons_in_feeds_follow_subscriptions(self):
+        """Кнопки подписки у постов в лентах меняются после подписки,
+        у своих постов кнопки нет."""
+        unfollow = reverse(
+            PROFILE_UNFOLLOW_URL_NAME, kwargs={'username': self.user})
+        follow = reverse(
+            PROFILE_FOLLOW_URL_NAME, kwargs={'username': self.user})
+        for url in (self.INDEX_URL_REVERSE, self.GROUP_LIST_URL_REVERSE):
+            with self.subTest(url=url):
+                self.assertContains(self.another_client.get(url), follow)
+                self.assertNotContains(
+                    self.authorized_client.get(url), follow)
+        self.another_client.get(follow)
+        for url in (self.INDEX_URL_REVERSE, self.GROUP_LIST_URL_REVERSE):
+            with self.subTest(url=url):
+                response = self.another_client.get(url)
+                self.assertContains(response, unfollow)
+                self.assertNotContains(response, follow)
+        response = self.another_client.get(self.PROFILE_URL_REVERSE)
+        self.assertTrue(response.context['following'])
+
+    def test_page_fragments_shared_between_users(self):
+        """Фрагмент ленты один на всех: второй пользователь получает его
+        из кэша, без запроса постов, но со своими кнопками подписки."""
+        follow = reverse(
+            PROFILE_FOLLOW_URL_NAME, kwargs={'username': self.user})
+        for url in (self.INDEX_URL_REVERSE, self.GROUP_LIST_URL_REVERSE):
+            with self.subTest(url=url):
+                cache.clear()
+                self.assertNotContains(
+                    self.authorized_client.get(url), follow)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.another_client.get(url)
+                self.assertContains(response, follow)
+                self.assertContains(response, self.post.text)
+                self.assertFalse([
+                    query for query in queries
+                    if 'FROM "posts_post"' in query['sql']])
+
+
+def cursor_token(direction, values):
+    """Курсор в формате CursorPaginator с произвольным содержимым."""
+    return base64.urlsafe_b64encode(
+        json.dumps([direction, values]).encode()).decode()
+
+
+BAD_CURSORS = (
+    cursor_token('n', ['garbage', '1']),
+    cursor_token('n', [None, None]),
+    cursor_token('n', 'ab'),
+    cursor_token('p', {'pub_date': 1, 'id': 2}),
+)
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -242,9 +451,16 @@ class PaginatorViewsTest(TestCase):
                                   group=cls.group,
                                   author=cls.user))
         Post.objects.bulk_create(cls.posts)
+        # bulk_create не шлёт сигналы: счётчики пересчитываем вручную.
+        counters.recount()
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.FOLLOW_INDEX_URL_REVERSE = reverse(FOLLOW_INDEX_URL_NAME)
 
     def setUp(self):
         cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
 
     def test_first_and_second_page_contains_ten_and_three_records(self):
         """Проверка: количество постов на
@@ -262,3 +478,52 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(
                     len(response_two.context['page_obj']), MIN_POST_LIMIT
                 )
+
+    def test_bad_cursor_shows_first_page(self):
+        """Подделанный курсор даёт первую страницу, а не ошибку 500."""
+        urls_names = (
+            self.INDEX_URL_REVERSE,
+            self.GROUP_LIST_URL_REVERSE,
+            self.PROFILE_URL_REVERSE,
+            self.FOLLOW_INDEX_URL_REVERSE,
+        )
+        for url in urls_names:
+            first = list(self.reader_client.get(
+                url + '?cursor=').context['page_obj'])
+            for cursor in BAD_CURSORS:
+                with self.subTest(url=url, cursor=cursor):
+                    response = self.reader_client.get(url, {'cursor': cursor})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(
+                        list(response.context['page_obj']), first)
+
+    def test_cursor_pages_walk_forward_and_back_without_count(self):
+        """Курсорная пагинация: 10 и 3 поста, возврат назад,
+        без COUNT(*) в запросах."""
+        urls_names = (
+            self.INDEX_URL_REVERSE,
+            self.GROUP_LIST_URL_REVERSE,
+            self.PROFILE_URL_REVERSE,
+            self.FOLLOW_INDEX_URL_REVERSE,
+        )
+        for url in urls_names:
+            with self.subTest(url=url):
+                page = self.reader_client.get(
+                    url + '?cursor=').context['page_obj']
+                self.assertEqual(len(page), POST_LIMIT)
+                self.assertFalse(page.has_previous())
+                second = self.reader_client.get(
+                    url + '?cursor=' + page.next_cursor).context['page_obj']
+                self.assertEqual(len(second), MIN_POST_LIMIT)
+                self.assertFalse(second.has_next())
+                self.assertFalse(set(page) & set(second))
+                back = self.reader_client.get(
+                    url + '?cursor=' + second.previous_cursor
+                ).context['page_obj']
+                self.assertEqual(list(back), list(page))
+        for url in (self.INDEX_URL_REVERSE, self.FOLLOW_INDEX_URL_REVERSE):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.reader_client.get(url + '?cursor=')
+                self.assertFalse(
+                    any('COUNT(' in query['sql'] for query in queries))
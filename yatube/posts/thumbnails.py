@@ -0,0 +1,189 @@
+"""Фоновая генерация миниатюр картинок постов.
+
+Шаблоны берут только уже готовые миниатюры (thumbnail_ready) и до их
+появления показывают заглушку; сами миниатюры считаются в пуле потоков
+после сохранения поста, поэтому ресайз Pillow не попадает во время ответа.
+
+Для каждой картинки готовится набор вариантов POST_IMAGE_WIDTHS в WebP и
+JPEG, шаблон отдаёт их через srcset, а браузер выбирает нужную ширину.
+"""
+import io
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from core.metrics import THUMBNAIL_TIME
+
+from . import caching
+
+logger = logging.getLogger(__name__)
+
+# Пропорции карточки поста: 960x339.
+POST_IMAGE_RATIO = 339 / 960
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+
+ResponsiveImage = namedtuple(
+    'ResponsiveImage', 'src width height srcset webp_srcset')
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который ищет миниатюру, но никогда её не создаёт."""
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        # Те же опции по умолчанию, что в ThumbnailBackend.get_thumbnail,
+        # иначе имя файла миниатюры не совпадёт.
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return default.kvstore.get(ImageFile(
+            self._get_thumbnail_filename(source, geometry_string, options),
+            default.storage
+        ))
+
+
+backend = ReadyThumbnailBackend()
+
+
+def variants():
+    """Пары (geometry, options) всех вариантов картинки поста."""
+    return [
+        ('{}x{}'.format(width, round(width * POST_IMAGE_RATIO)),
+         {'crop': 'center', 'upscale': True, 'format': image_format})
+        for image_format in POST_IMAGE_FORMATS
+        for width in settings.POST_IMAGE_WIDTHS
+    ]
+
+
+def thumbnail_ready(post):
+    """Готовые варианты картинки поста или None (и тогда — в очередь)."""
+    if not post.image:
+        return None
+    thumbnails = _ready(post.image)
+    if None in thumbnails:
+        schedule(post)
+        return None
+    srcsets = {}
+    for thumbnail, (_, options) in zip(thumbnails, variants()):
+        srcsets.setdefault(options['format'], []).append(
+            '{} {}w'.format(thumbnail.url, thumbnail.width))
+    largest = thumbnails[-1]
+    return ResponsiveImage(
+        src=largest.url,
+        width=largest.width,
+        height=largest.height,
+        srcset=', '.join(srcsets['JPEG']),
+        webp_srcset=', '.join(srcsets['WEBP']),
+    )
+
+
+def _ready(image):
+    return [
+        backend.get_ready_thumbnail(image, geometry, **options)
+        for geometry, options in variants()
+    ]
+
+
+def downscale(upload):
+    """Уменьшает загруженный оригинал до POST_IMAGE_MAX_SIZE по большей
+    стороне; меньшие картинки возвращаются без изменений."""
+    limit = settings.POST_IMAGE_MAX_SIZE
+    upload.seek(0)
+    with Image.open(upload) as image:
+        if max(image.size) <= limit:
+            upload.seek(0)
+            return upload
+        image_format = image.format
+        # reducing_gap=1 позволяет JPEG декодироваться сразу в меньшем
+        # масштабе (draft), не поднимая в память всё разрешение.
+        image.thumbnail((limit, limit), Image.LANCZOS, reducing_gap=1.0)
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, quality=85, optimize=True)
+    return ContentFile(buffer.getvalue(), name=upload.name)
+
+
+def _job(post):
+    return (
+        post.image.name,
+        caching.post_scopes(post) + caching.card_scopes(post)
+    )
+
+
+def schedule(post):
+    """Ставит генерацию миниатюр поста в фоновый пул (один раз).
+
+    Без пула (THUMBNAIL_WORKERS = 0) ничего не делает: отрисовка страницы
+    никогда не ресайзит картинки сама.
+    """
+    if not settings.THUMBNAIL_WORKERS:
+        return
+    name, scopes = _job(post)
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    _get_executor().submit(generate, name, scopes)
+
+
+def schedule_on_commit(post):
+    """После сохранения поста: в пул, а без пула — сразу, в запросе,
+    который пост сохранил."""
+    if not post.image:
+        return
+    if settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: schedule(post))
+    else:
+        transaction.on_commit(lambda: generate(*_job(post)))
+
+
+def generate(name, scopes):
+    try:
+        missing = [
+            variant for variant, thumbnail in zip(variants(), _ready(name))
+            if thumbnail is None
+        ]
+        if missing:
+            with THUMBNAIL_TIME.time():
+                for geometry, options in missing:
+                    get_thumbnail(name, geometry, **options)
+            # Карточки и страницы с заглушкой вместо картинки устарели.
+            caching.bump(*scopes)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        if threading.current_thread().name.startswith('thumbnails'):
+            # Соединение потока пула с базой нужно только на время задачи.
+            connection.close()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+    return _executor
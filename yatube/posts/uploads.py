@@ -0,0 +1,70 @@
+"""Загрузка картинок постов с ограниченным расходом памяти.
+
+Крупные файлы пишутся на диск по частям, а всё, что сверх
+POST_IMAGE_MAX_UPLOAD_SIZE, отбрасывается, не дочитываясь в память:
+check_image (его вызывает PostForm) отклонит такой файл по размеру, а по
+заголовку картинки — слишком большое разрешение, ещё до полного
+декодирования в Pillow.
+"""
+from django import forms
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+from core.metrics import UPLOAD_SIZE
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет на диск только первые POST_IMAGE_MAX_UPLOAD_SIZE байт файла.
+
+    Размер файла (file.size) остаётся настоящим, поэтому форма может
+    отклонить слишком большой файл с понятной ошибкой.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        limit = settings.POST_IMAGE_MAX_UPLOAD_SIZE
+        if self.received < limit:
+            self.file.write(raw_data[:limit - self.received])
+        self.received += len(raw_data)
+
+
+ERROR_MESSAGES = {
+    'file_too_large': 'Файл больше %(limit)s.',
+    'image_too_large': 'Разрешение картинки больше %(limit)s мегапикселей.',
+}
+
+
+def check_image(data):
+    """Отклоняет файл по размеру и по разрешению из заголовка картинки."""
+    UPLOAD_SIZE.observe(data.size)
+    limit = settings.POST_IMAGE_MAX_UPLOAD_SIZE
+    if data.size > limit:
+        raise forms.ValidationError(
+            ERROR_MESSAGES['file_too_large'],
+            code='file_too_large',
+            params={'limit': filesizeformat(limit)},
+        )
+    limit = settings.POST_IMAGE_MAX_PIXELS
+    error = forms.ValidationError(
+        ERROR_MESSAGES['image_too_large'],
+        code='image_too_large',
+        params={'limit': limit // 10 ** 6},
+    )
+    # Image.open читает только заголовок, пиксели не декодируются.
+    try:
+        with Image.open(data) as image:
+            width, height = image.size
+    except Image.DecompressionBombError as exc:
+        raise error from exc
+    except Exception:
+        # Не картинка: ошибку выдаст ImageField.to_python.
+        return
+    finally:
+        data.seek(0)
+    if width * height > limit:
+        raise error
@@ -1,60 +1,85 @@
 from django.shortcuts import render, get_object_or_404
-from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
 from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition, require_POST
 
+from . import (
+    caching, conditional, counters, feeds, following, recommendations,
+    search)
 from .models import Post, Group, User, Follow
 from .forms import PostForm, CommentForm
-from yatube.settings import POSTS_PER_PAGE
+from .paginators import CursorPaginator, get_page
+from yatube.settings import (
+    COMMENTS_PER_PAGE, FOLLOW_BATCH_LIMIT, POSTS_PER_PAGE)
 
 
-def get_page(request, post_list):
-    return Paginator(post_list, POSTS_PER_PAGE).get_page(
-        request.GET.get('page'))
-
-
-@cache_page(20, key_prefix='index_page')
+@condition(etag_func=conditional.index)
 def index(request):
     return render(request, 'posts/index.html', {
+        'cache_version': caching.versions(
+            'index', 'groups', 'authors'),
         'page_obj': get_page(
-            request, Post.objects.select_related('author', 'group').all())
+            request, Post.objects.select_related('author', 'group').all(),
+            count=counters.posts_total())
     })
 
 
+@condition(etag_func=conditional.group_posts)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     return render(request, 'posts/group_list.html', {
         'group': group,
+        'cache_version': caching.versions(
+            f'group:{group.id}', 'authors'),
         'page_obj': get_page(request, group.posts.select_related(
-            'author', 'group').all())
+            'author', 'group').all(), count=group.posts_count)
     })
 
 
+@condition(etag_func=conditional.profile)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
     return render(request, 'posts/profile.html', {
         'author': author,
-        'page_obj': get_page(request, author.posts.all()),
-        'following': (
-            request.user != author
-            and request.user.is_authenticated
-            and Follow.objects.filter(
-                author=author,
-                user=request.user
-            ).exists())
+        'cache_version': caching.versions(
+            f'profile:{author.id}', 'groups', 'authors'),
+        'page_obj': get_page(
+            request, author.posts.select_related('group'),
+            count=author.stats.posts_count),
+        'following': author.id in following.authors(request.user),
+        'recommendations_version': recommendations.version(request.user),
     })
 
 
+@condition(etag_func=conditional.post_detail)
 def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id)
     return render(
         request, 'posts/post_detail.html', {
-            'post': get_object_or_404(
-                Post.objects.select_related('author', 'group'), id=post_id),
+            'post': post,
+            'comments': CursorPaginator(
+                post.comments.prefetch_related('author'), COMMENTS_PER_PAGE,
+                ordering=('-created', '-id')
+            ).get_page(request.GET.get('cursor')),
             'form': CommentForm(),
+            'cache_version': caching.versions(
+                f'post:{post.id}', f'profile:{post.author_id}', 'groups',
+                'authors'),
         })
 
 
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    return render(request, 'posts/search.html', {
+        'query': query,
+        'page_obj': search.search(
+            query, POSTS_PER_PAGE, request.GET.get('cursor')),
+    })
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -101,23 +126,51 @@ def add_comment(request, post_id):
 
 
 @login_required
+@condition(etag_func=conditional.follow_index)
 def follow_index(request):
     return render(request, 'posts/follow.html', {
-        'page_obj': get_page(request, Post.objects.filter(
-            author__following__user=request.user))
+        'recommendations_version': recommendations.version(request.user),
+        'page_obj': feeds.page(request),
     })
 
 
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+    Follow.objects.follow(request.user, [author.id])
     return redirect('posts:follow_index')
 
 
 @login_required
 def profile_unfollow(request, username):
-    get_object_or_404(
-        Follow, user=request.user, author__username=username).delete()
+    author = get_object_or_404(User, username=username)
+    if not Follow.objects.unfollow(request.user, [author.id]):
+        raise Http404
     return redirect('posts:follow_index')
+
+
+@login_required
+@require_POST
+def follow_batch(request):
+    """Подписка или отписка сразу на список авторов.
+
+    POST action=follow|unfollow и username=… (повторяется). Ответ —
+    JSON с именами авторов, у которых подписка изменилась, и именами,
+    которых нет на сайте.
+    """
+    action = request.POST.get('action')
+    usernames = set(request.POST.getlist('username'))
+    if action not in ('follow', 'unfollow'):
+        return JsonResponse(
+            {'error': 'action должен быть follow или unfollow'}, status=400)
+    if len(usernames) > FOLLOW_BATCH_LIMIT:
+        return JsonResponse(
+            {'error': f'Не больше {FOLLOW_BATCH_LIMIT} авторов за раз'},
+            status=400)
+    authors = dict(User.objects.filter(
+        username__in=usernames).values_list('id', 'username'))
+    changed = getattr(Follow.objects, action)(request.user, authors)
+    return JsonResponse({
+        action: sorted(authors[author_id] for author_id in changed),
+        'unknown': sorted(usernames - set(authors.values())),
+    })
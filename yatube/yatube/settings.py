@@ -10,11 +10,27 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Test runs (manage.py test, pytest) keep the shared cache file, metrics and
+# profiles in a throwaway directory instead of the developer's ones in
+# BASE_DIR: tests clear the cache and write metrics files.
+
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
+if TESTING:
+    STATE_DIR = tempfile.mkdtemp(prefix='yatube-test-')
+    atexit.register(shutil.rmtree, STATE_DIR, ignore_errors=True)
+else:
+    STATE_DIR = BASE_DIR
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
@@ -50,13 +66,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.query_budget.QueryBudgetMiddleware',
+    'core.render_timing.RenderTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.db_routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.profiling.RequestProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -85,13 +106,105 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# 'production' (default) enables WAL and tuned pragmas on every connection,
+# keeps connections open between requests, starts transactions with BEGIN
+# IMMEDIATE and waits for busy writers ('timeout' seconds inside SQLite, then
+# 'busy_retries' retries with backoff); 'plain' is Django's stock SQLite.
+
+DATABASE_PROFILE = os.environ.get('YATUBE_DB_PROFILE', 'production')
+
+DATABASE_PROFILES = {
+    'plain': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    'production': {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'timeout': 5,
+            'busy_retries': 3,
+            'pragmas': {
+                'journal_mode': 'wal',
+                # Safe in WAL: a power loss may only drop the last commits.
+                'synchronous': 'normal',
+                'cache_size': -64000,  # KiB
+                'mmap_size': 256 * 1024 * 1024,
+                'temp_store': 'memory',
+            },
+        },
+    },
 }
 
+DATABASES = {
+    'default': DATABASE_PROFILES[DATABASE_PROFILE],
+}
+
+# Write-heavy tables in their own SQLite files, each with its own writer
+# lock: with YATUBE_DB_SPLIT=1 the models of DATABASE_SPLIT_MODELS live in
+# db-<alias>.sqlite3 next to db.sqlite3. `manage.py split_databases` creates
+# the files and copies existing rows from db.sqlite3. Nothing joins across
+# these files: code that needs a split model together with posts or users
+# runs two queries.
+
+DATABASE_SPLIT_MODELS = {}
+
+if os.environ.get('YATUBE_DB_SPLIT'):
+    DATABASE_SPLIT_MODELS = {
+        'posts.comment': 'comments',
+        'posts.follow': 'follows',
+        'sessions.session': 'sessions',
+    }
+
+for alias in sorted(set(DATABASE_SPLIT_MODELS.values())):
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, f'db-{alias}.sqlite3'),
+    }
+
+# Read replicas: reads of DATABASE_REPLICA_VIEWS go to a random alias from
+# DATABASE_REPLICAS, writes always go to 'default', and a session that wrote
+# reads from 'default' for DATABASE_STICKY_SECONDS. YATUBE_DB_REPLICAS is a
+# comma-separated list of SQLite files that act as replicas locally; refresh
+# them from db.sqlite3 with `manage.py sync_replicas`.
+
+DATABASE_ROUTERS = [
+    'core.db_routers.SplitRouter',
+    'core.db_routers.ReplicaRouter',
+]
+
+DATABASE_REPLICAS = []
+
+for number, path in enumerate(filter(
+        None, os.environ.get('YATUBE_DB_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+# Test runs get one more database: it is migrated but never receives test
+# data, so with override_settings(DATABASE_REPLICAS=['lagging_replica']) it
+# plays a replica that has not caught up with 'default'.
+
+if TESTING:
+    DATABASES['lagging_replica'] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(STATE_DIR, 'lagging-replica.sqlite3'),
+    }
+
+DATABASE_REPLICA_VIEWS = (
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:follow_index',
+)
+
+DATABASE_STICKY_SECONDS = 15
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -153,12 +266,156 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 # CACHES
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+# 'sqlite' (default) keeps one cache file shared by all worker processes,
+# 'redis' uses REDIS_URL, 'locmem' is a per-process cache without sharing.
+# Shared caches sit behind a small per-process LRU (FRONT_TIMEOUT seconds).
+
+CACHE_BACKEND = os.environ.get('YATUBE_CACHE', 'sqlite')
+
+SHARED_CACHES = {
+    'sqlite': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(STATE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'redis': {
+        'BACKEND': 'core.cache_backends.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+    },
 }
 
+if CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.TwoLevelCache',
+            'OPTIONS': {
+                'SHARED': 'shared',
+                'FRONT_TIMEOUT': 1,
+                'FRONT_MAX_ENTRIES': 1000,
+            },
+        },
+        'shared': SHARED_CACHES[CACHE_BACKEND],
+    }
+
 # Posts count
 
 POSTS_PER_PAGE = 10
+
+# Follow feed length per user
+
+FEED_LENGTH = 1000
+
+# Posts pagination mode: 'page' (?page=N) or 'cursor' (?cursor=<token>).
+# A ?cursor= parameter switches any feed to cursor mode.
+
+POSTS_PAGINATION = 'page'
+
+# Template fragments lifetime; freshness comes from versioned keys
+
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Comments per page on post_detail (cursor pagination)
+
+COMMENTS_PER_PAGE = 20
+
+# Most authors one request to posts:follow_batch may follow or unfollow
+
+FOLLOW_BATCH_LIMIT = 100
+
+# "Who to follow": `manage.py recommend_follows` stores RECOMMENDATIONS_TOP
+# friends-of-friends authors per user, looking at no more than
+# RECOMMENDATIONS_FANOUT follows per hop and weighting authors by their posts
+# in the last RECOMMENDATIONS_ACTIVITY_DAYS; follow_index and profile show
+# RECOMMENDATIONS_SHOWN of them that the user does not follow yet.
+
+RECOMMENDATIONS_TOP = 20
+
+RECOMMENDATIONS_SHOWN = 5
+
+RECOMMENDATIONS_FANOUT = 200
+
+RECOMMENDATIONS_ACTIVITY_DAYS = 30
+
+# SQL query budgets per URL name: QueryBudgetMiddleware logs views that
+# exceed them when YATUBE_QUERY_BUDGET is set, core.query_budget.query_budget()
+# fails tests that do.
+
+QUERY_BUDGET_ENABLED = bool(os.environ.get('YATUBE_QUERY_BUDGET'))
+
+QUERY_BUDGETS = {
+    'posts:index': 5,
+    'posts:group_list': 6,
+    'posts:profile': 7,
+    'posts:post_detail': 6,
+    'posts:follow_index': 6,
+}
+
+# Prometheus metrics at /metrics. Every thread of every worker writes its own
+# memory-mapped file in METRICS_DIR and the page sums them all; a starting
+# worker folds the files of dead processes into one archive file. The page is
+# served to METRICS_ALLOWED_IPS (YATUBE_METRICS_ALLOWED_IPS, comma-separated;
+# REMOTE_ADDR, so list the proxy when one sits in front) and to staff.
+
+METRICS_ENABLED = True
+
+METRICS_DIR = os.environ.get(
+    'YATUBE_METRICS_DIR', os.path.join(STATE_DIR, 'metrics'))
+
+METRICS_ALLOWED_IPS = list(filter(None, os.environ.get(
+    'YATUBE_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')))
+
+# Template and template tag render timing, on when YATUBE_RENDER_TIMING is
+# set: RenderTimingMiddleware sends the heaviest RENDER_TIMING_HEADER_ITEMS in
+# Server-Timing, logs every request to yatube.render_timing and sums them per
+# URL name for the admin.
+
+RENDER_TIMING_ENABLED = bool(os.environ.get('YATUBE_RENDER_TIMING'))
+
+RENDER_TIMING_HEADER_ITEMS = 10
+
+# Background thumbnail workers; with 0 the request that saves a post generates
+# its thumbnails, pages only ever show placeholders for missing ones
+
+THUMBNAIL_WORKERS = 2
+
+# Widths of pre-sized post image variants (each in WebP and JPEG) and the
+# longest side uploaded originals are downscaled to
+
+POST_IMAGE_WIDTHS = (320, 640, 960)
+
+POST_IMAGE_MAX_SIZE = 1920
+
+# Uploads: files above FILE_UPLOAD_MAX_MEMORY_SIZE are streamed to disk and
+# truncated past POST_IMAGE_MAX_UPLOAD_SIZE; PostForm rejects them, and
+# images above POST_IMAGE_MAX_PIXELS, from the header before decoding
+
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'posts.uploads.LimitedTemporaryFileUploadHandler',
+]
+
+POST_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+
+POST_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+
+# Per-request profiler: staff add ?profile=1 or send X-Profile: 1, and every
+# PROFILER_SAMPLE_RATE-th request is sampled (0 turns sampling off). The last
+# PROFILER_SLOTS profiles are kept in PROFILER_DIR and shown in the admin.
+
+PROFILER_ENABLED = True
+
+PROFILER_VIEW_MODULES = ('posts.views',)
+
+PROFILER_SAMPLE_RATE = 0
+
+PROFILER_DIR = os.path.join(STATE_DIR, 'profiles')
+
+PROFILER_SLOTS = 50
+
+PROFILER_TOP_FUNCTIONS = 40
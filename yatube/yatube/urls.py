@@ -18,12 +18,16 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import prometheus_metrics
+
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
+    path('admin/profiles/', include('core.urls', namespace='core')),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics', prometheus_metrics, name='metrics'),
 ]
 
 handler404 = 'core.views.page_not_found'